@@ -0,0 +1,232 @@
+import sys
+import json
+import time
+import random
+import typing
+import argparse
+import tracemalloc
+from decimal import Decimal
+from types import SimpleNamespace
+import shioaji as sj
+from touchprice import TouchOrderExecutor, TouchOrderCond, TouchCmd, OrderCmd, Price, Qty
+from benchmark.fake_api import FakeApi
+
+PRICE_FIELDS = ["close", "high", "low", "buy_price", "sell_price"]
+QTY_FIELDS = ["volume", "total_volume"]
+
+
+def make_codes(num: int) -> typing.List[str]:
+    return ["TXF{:04d}".format(i) if i % 2 else str(2000 + i) for i in range(num)]
+
+
+ORDER = sj.Order(
+    action="Buy",
+    price=-1,
+    quantity=1,
+    order_type="ROD",
+    price_type="MKT",
+    octype="Auto",
+)
+
+
+def make_condition(
+    rnd: random.Random, code: str, fields: int, info: typing.Any
+) -> TouchOrderCond:
+    # thresholds the current quote does not meet, a condition only fires
+    # once the stream moves to it
+    kwargs = {}
+    for key in rnd.sample(PRICE_FIELDS + QTY_FIELDS, fields):
+        trend = rnd.choice(["Up", "Down", "Equal"])
+        value = getattr(info, key)
+        if key in QTY_FIELDS:
+            if trend == "Down" and value > 0:
+                qty = rnd.randint(0, value - 1)
+            else:
+                trend = "Up" if trend == "Down" else trend
+                qty = value + rnd.randint(1, 50)
+            kwargs[key] = Qty(qty=qty, trend=trend)
+        else:
+            sign = {"Up": 1, "Down": -1}.get(trend) or rnd.choice([1, -1])
+            price = float(value) + sign * rnd.randint(1, 50) / 10
+            kwargs[key] = Price(price=round(price, 1), trend=trend)
+    return TouchOrderCond(
+        touch_cmd=TouchCmd(code=code, **kwargs),
+        order_cmd=OrderCmd(code=code, order=ORDER),
+    )
+
+
+def make_conditions(
+    rnd: random.Random,
+    codes: typing.List[str],
+    conds: int,
+    fields: int,
+    info: typing.Any,
+) -> typing.List[TouchOrderCond]:
+    return [
+        make_condition(rnd, code, fields, info)
+        for code in codes
+        for _ in range(conds)
+    ]
+
+
+def synthetic_stream(
+    rnd: random.Random, codes: typing.List[str], events: int
+) -> typing.Iterator[typing.Tuple[str, SimpleNamespace]]:
+    state = {code: [Decimal("100.0"), Decimal("100.0"), Decimal("100.0"), 0] for code in codes}
+    step = Decimal("0.1")
+    for _ in range(events):
+        code = rnd.choice(codes)
+        close, high, low, total = state[code]
+        if rnd.random() < 0.5:
+            close = close + step * rnd.randint(-2, 2)
+            high, low = max(high, close), min(low, close)
+            volume = rnd.randint(1, 5)
+            total += volume
+            state[code] = [close, high, low, total]
+            yield "tick", SimpleNamespace(
+                code=code,
+                close=close,
+                high=high,
+                low=low,
+                volume=volume,
+                total_volume=total,
+                tick_type=rnd.randint(1, 2),
+                simtrade=0,
+            )
+        else:
+            yield "bidask", SimpleNamespace(
+                code=code,
+                bid_price=[close - step],
+                ask_price=[close],
+                bid_volume=[rnd.randint(1, 20)],
+                ask_volume=[rnd.randint(1, 20)],
+                simtrade=0,
+            )
+
+
+def recorded_stream(path: str) -> typing.Iterator[typing.Tuple[str, SimpleNamespace]]:
+    # one json object per line: {"kind": "tick" | "bidask", ...quote fields}
+    with open(path) as f:
+        for line in f:
+            data = json.loads(line)
+            kind = data.pop("kind")
+            for key in ["close", "high", "low"]:
+                if key in data:
+                    data[key] = Decimal(str(data[key]))
+            for key in ["bid_price", "ask_price"]:
+                if key in data:
+                    data[key] = [Decimal(str(v)) for v in data[key]]
+            data.setdefault("simtrade", 0)
+            yield kind, SimpleNamespace(**data)
+
+
+def percentile(values: typing.List[int], pct: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct))] / 1000
+
+
+def run(
+    codes: int,
+    conds: int,
+    fields: int,
+    events: int,
+    seed: int = 0,
+    record: typing.Optional[str] = None,
+) -> typing.Dict[str, typing.Any]:
+    rnd = random.Random(seed)
+    code_list = make_codes(codes)
+    api = FakeApi(code_list)
+    snapshot = SimpleNamespace(**api.snapshots([None])[0])
+    conditions = make_conditions(rnd, code_list, conds, fields, snapshot)
+    tracemalloc.start()
+    touch = TouchOrderExecutor(api)
+    touch.add_conditions(conditions)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    stream = list(
+        recorded_stream(record) if record else synthetic_stream(rnd, code_list, events)
+    )
+    callbacks = {"tick": touch.integration_tick, "bidask": touch.integration_bidask}
+    latencies = []
+    history = touch.history
+    clock = time.perf_counter_ns
+    refill = 0
+    start = clock()
+    for kind, quote in stream:
+        cb = callbacks[kind]
+        begin = clock()
+        cb(None, quote)
+        end = clock()
+        latencies.append(end - begin)
+        if history:
+            # fired conditions are put back at new thresholds, untimed, so
+            # every quote is evaluated against the same number of conditions
+            while history:
+                _, (code, _) = history.popitem(last=False)
+                touch.add_condition(
+                    make_condition(rnd, code, fields, touch.infos.get(code, snapshot))
+                )
+            refill += clock() - end
+    elapsed = (clock() - start - refill) / 1e9
+    latencies.sort()
+    return dict(
+        codes=codes,
+        conds=conds,
+        fields=fields,
+        events=len(stream),
+        ticks_per_sec=len(stream) / elapsed if elapsed else 0.0,
+        p50_us=percentile(latencies, 0.5),
+        p99_us=percentile(latencies, 0.99),
+        mem_kb=memory / 1024,
+        orders=len(api.orders),
+        live=len(touch.cond_codes),
+    )
+
+
+COLUMNS = [
+    "codes",
+    "conds",
+    "fields",
+    "events",
+    "ticks_per_sec",
+    "p50_us",
+    "p99_us",
+    "mem_kb",
+    "orders",
+    "live",
+]
+
+
+def main(argv: typing.Optional[typing.List[str]] = None):
+    parser = argparse.ArgumentParser(description="touchprice trigger path benchmark")
+    parser.add_argument("--codes", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--conds", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--fields", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="jsonl file of recorded ticks and bidasks")
+    parser.add_argument("--json", action="store_true", help="print one json per run")
+    args = parser.parse_args(argv)
+    if not args.json:
+        print(" ".join("{:>13}".format(col) for col in COLUMNS))
+    for codes in args.codes:
+        for conds in args.conds:
+            for fields in args.fields:
+                res = run(codes, conds, fields, args.events, args.seed, args.record)
+                if args.json:
+                    print(json.dumps(res))
+                else:
+                    print(
+                        " ".join(
+                            "{:>13.1f}".format(res[col])
+                            if isinstance(res[col], float)
+                            else "{:>13}".format(res[col])
+                            for col in COLUMNS
+                        )
+                    )
+                sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
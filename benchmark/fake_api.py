@@ -0,0 +1,87 @@
+import typing
+import itertools
+from types import SimpleNamespace
+from shioaji import Exchange
+from shioaji.contracts import Future, Stock
+
+
+class FakeQuote:
+    def __init__(self):
+        self.callbacks: typing.Dict[str, typing.Callable] = {}
+        self.subscribed: typing.Dict[typing.Tuple[str, str], int] = {}
+
+    def __getattr__(self, name: str):
+        if name.startswith("set_on_"):
+            return lambda cb: self.callbacks.__setitem__(name[len("set_on_") :], cb)
+        raise AttributeError(name)
+
+    def subscribe(self, contract, quote_type: str = "tick"):
+        key = (contract.code, quote_type)
+        self.subscribed[key] = self.subscribed.get(key, 0) + 1
+
+    def unsubscribe(self, contract, quote_type: str = "tick"):
+        self.subscribed.pop((contract.code, quote_type), None)
+
+
+class FakeCategory:
+    def __init__(self, contracts: typing.Dict[str, typing.Any]):
+        self._code2contract = contracts
+
+
+class FakeApi:
+    # local stand-in for sj.Shioaji with just what TouchOrderExecutor calls
+    def __init__(self, codes: typing.Iterable[str], price: float = 100.0):
+        self.price = price
+        stocks = {}
+        futures = {}
+        for code in codes:
+            if code[0].isdigit():
+                stocks[code] = Stock(
+                    exchange=Exchange.TSE,
+                    code=code,
+                    symbol="TSE" + code,
+                    name=code,
+                    category="00",
+                    limit_up=price * 1.1,
+                    limit_down=price * 0.9,
+                    reference=price,
+                )
+            else:
+                futures[code] = Future(
+                    code=code,
+                    symbol=code,
+                    name=code,
+                    category=code[:3],
+                    delivery_month="202003",
+                    underlying_kind="I",
+                    limit_up=price * 1.1,
+                    limit_down=price * 0.9,
+                    reference=price,
+                )
+        self.Contracts = [
+            ("Stocks", FakeCategory(stocks)),
+            ("Futures", FakeCategory(futures)),
+        ]
+        self.quote = FakeQuote()
+        self.orders: typing.List[typing.Tuple[typing.Any, typing.Any]] = []
+        self._seqno = itertools.count(1)
+
+    def snapshots(self, contracts: typing.List[typing.Any]) -> typing.List[dict]:
+        return [
+            dict(
+                close=self.price,
+                buy_price=self.price,
+                sell_price=self.price,
+                high=self.price,
+                low=self.price,
+                change_price=0.0,
+                change_rate=0.0,
+                volume=0,
+                total_volume=0,
+            )
+            for _ in contracts
+        ]
+
+    def place_order(self, contract, order, cb=None):
+        self.orders.append((contract, order))
+        return SimpleNamespace(contract=contract, order=order, seqno=next(self._seqno))
@@ -0,0 +1,46 @@
+import time
+import pytest
+from shioaji.contracts import Future
+from shioaji.order import Order
+
+
+@pytest.fixture()
+def contract():
+    return Future(
+        code="TXFC0",
+        symbol="TXF202003",
+        name="臺股期貨",
+        category="TXF",
+        delivery_month="202003",
+        underlying_kind="I",
+        limit_up=10805.0,
+        limit_down=8841.0,
+        reference=9823.0,
+        update_date="2020/04/07",
+    )
+
+
+@pytest.fixture()
+def order():
+    return Order(
+        action="Buy",
+        price=-1,
+        quantity=1,
+        order_type="ROD",
+        price_type="MKT",
+        octype="Auto",
+    )
+
+
+@pytest.fixture()
+def wait_for():
+    # poll predicate until it holds, for state changed by other threads
+    def wait(predicate, timeout: float = 20) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.005)
+        return False
+
+    return wait
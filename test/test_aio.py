@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+from shioaji.contracts import Future
+from shioaji.order import Order
+from touchprice import TouchOrderCond, OrderCmd, TouchCmd, Price
+from touchprice.aio import AsyncTouchOrderExecutor, TriggerEvent
+
+
+@pytest.fixture()
+def api(mocker):
+    api = mocker.MagicMock()
+    api.snapshots = mocker.MagicMock(
+        return_value=[
+            dict(
+                close=100,
+                buy_price=100,
+                sell_price=100,
+                high=100,
+                low=100,
+                change_price=0,
+                change_rate=0,
+                volume=1,
+                total_volume=1,
+            )
+        ]
+    )
+    return api
+
+
+def tick(code: str, close: int):
+    return SimpleNamespace(
+        code=code,
+        close=Decimal(close),
+        high=Decimal(close),
+        low=Decimal(close),
+        total_volume=10,
+        volume=1,
+        tick_type=1,
+        simtrade=0,
+    )
+
+
+def condition(price: int, order: Order):
+    return TouchOrderCond(
+        touch_cmd=TouchCmd(code="TXFC0", close=Price(price=price, trend="Up")),
+        order_cmd=OrderCmd(code="TXFC0", order=order),
+    )
+
+
+testcase_async_executor = [
+    [[99, 101, 103], 2],
+    [[99, 100], 0],
+    [[105], 2],
+]
+
+
+@pytest.mark.parametrize("closes, order_count", testcase_async_executor)
+def test_async_executor(
+    mocker, api, contract: Future, order: Order, closes, order_count
+):
+    async def main():
+        touch_order = AsyncTouchOrderExecutor(api, queue_size=2)
+        touch_order.contracts = {"TXFC0": contract}
+        await touch_order.start()
+        cids = [
+            await touch_order.add_condition(condition(price, order))
+            for price in (101, 103, 107)
+        ]
+        assert await touch_order.delete_condition(cids[2])
+        for close in closes:
+            await touch_order.put_tick(None, tick("TXFC0", close))
+        await touch_order.join()
+        events = []
+        if order_count:
+            async for event in touch_order:
+                events.append(event)
+                if len(events) == order_count:
+                    break
+        await touch_order.close()
+        return touch_order, events
+
+    touch_order, events = asyncio.run(main())
+    assert api.place_order.call_count == order_count
+    assert sorted(event.cid for event in events) == [1, 2][:order_count]
+    assert all(isinstance(event, TriggerEvent) for event in events)
+    assert all(event.trade is api.place_order.return_value for event in events)
+    assert len(touch_order.cond_codes) == 2 - order_count
+
+
+def test_async_backpressure(mocker, api, contract: Future, order: Order):
+    async def main():
+        touch_order = AsyncTouchOrderExecutor(api, queue_size=1)
+        touch_order.contracts = {"TXFC0": contract}
+        await touch_order.start()
+        await touch_order.add_condition(condition(150, order))
+        touch_order._runner.cancel()
+        await asyncio.sleep(0)
+        feed = threading.Thread(
+            target=lambda: [
+                touch_order._tick_threadsafe(None, tick("TXFC0", close))
+                for close in (120, 150)
+            ]
+        )
+        feed.start()
+        await asyncio.sleep(0.05)
+        # the second quote waits in the feed thread until the queue drains
+        assert touch_order.quotes.qsize() == 1
+        assert feed.is_alive()
+        touch_order._runner = asyncio.get_running_loop().create_task(
+            touch_order.run()
+        )
+        while feed.is_alive():
+            await asyncio.sleep(0.01)
+        await touch_order.join()
+        event = await touch_order.triggers.get()
+        await touch_order.close()
+        return event
+
+    event = asyncio.run(main())
+    assert event.cid == 1
+    assert api.place_order.call_count == 1
+
+
+def test_async_dropped_triggers(mocker, api, contract: Future, order: Order):
+    async def main():
+        touch_order = AsyncTouchOrderExecutor(api, trigger_size=1)
+        touch_order.contracts = {"TXFC0": contract}
+        await touch_order.start()
+        for price in (101, 103):
+            await touch_order.add_condition(condition(price, order))
+        await touch_order.put_tick(None, tick("TXFC0", 105))
+        await touch_order.join()
+        await touch_order.close()
+        return touch_order
+
+    touch_order = asyncio.run(main())
+    assert api.place_order.call_count == 2
+    assert touch_order.dropped_triggers == 1
+    assert touch_order.triggers.qsize() == 1
+
+
+def test_async_quote_error(mocker, caplog, api, contract: Future, order: Order):
+    async def main():
+        touch_order = AsyncTouchOrderExecutor(api, queue_size=1)
+        touch_order.contracts = {"TXFC0": contract}
+        await touch_order.start()
+        await touch_order.add_condition(condition(105, order))
+        bad = tick("TXFC0", 100)
+        bad.close = None
+        for quote in (bad, tick("TXFC0", 101), tick("TXFC0", 105)):
+            await asyncio.wait_for(touch_order.put_tick(None, quote), timeout=5)
+        await touch_order.join()
+        assert not touch_order._runner.done()
+        await touch_order.close()
+
+    asyncio.run(main())
+    assert api.place_order.call_count == 1
+    assert "quote handler failed on TXFC0" in caplog.text
@@ -0,0 +1,49 @@
+import json
+from benchmark.bench_touch import run, main
+
+
+def test_bench_run():
+    res = run(codes=2, conds=5, fields=1, events=200, seed=1)
+    assert res["events"] == 200
+    assert res["ticks_per_sec"] > 0
+    assert res["p99_us"] >= res["p50_us"]
+    assert res["orders"] > 0
+    # fired conditions are replaced, the load stays the same
+    assert res["live"] == 2 * 5
+    again = run(codes=2, conds=5, fields=1, events=200, seed=1)
+    assert again["orders"] == res["orders"]
+
+
+def test_bench_record(tmp_path, capsys):
+    path = tmp_path / "ticks.jsonl"
+    path.write_text(
+        "\n".join(
+            json.dumps(line)
+            for line in [
+                dict(
+                    kind="tick",
+                    code="TXF0001",
+                    close=101.5,
+                    high=101.5,
+                    low=99.0,
+                    volume=2,
+                    total_volume=2,
+                    tick_type=1,
+                ),
+                dict(
+                    kind="bidask",
+                    code="TXF0001",
+                    bid_price=[101.4],
+                    ask_price=[101.5],
+                    bid_volume=[3],
+                    ask_volume=[4],
+                ),
+            ]
+        )
+    )
+    main(
+        ["--codes", "2", "--conds", "3", "--fields", "1"]
+        + ["--record", str(path), "--json"]
+    )
+    res = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert res["events"] == 2
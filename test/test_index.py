@@ -0,0 +1,77 @@
+import pytest
+import random
+from types import SimpleNamespace
+from touchprice import PriceGap, QtyGap, Trend
+from touchprice.index import ThresholdIndex
+from touchprice.predicate import compile_condition
+
+
+def gaps(**kwargs):
+    return SimpleNamespace(
+        **{
+            key: kwargs.get(key)
+            for key in [
+                "close",
+                "buy_price",
+                "sell_price",
+                "high",
+                "low",
+                "volume",
+                "total_volume",
+                "ask_volume",
+                "bid_volume",
+            ]
+        }
+    )
+
+
+testcase_crossed = [
+    [gaps(close=PriceGap(price=100, trend="Up")), 99, False],
+    [gaps(close=PriceGap(price=100, trend="Up")), 100, True],
+    [gaps(close=PriceGap(price=100, trend="Down")), 101, False],
+    [gaps(close=PriceGap(price=100, trend="Down")), 99, True],
+    [gaps(close=PriceGap(price=100, trend="Equal")), 100.5, False],
+    [gaps(close=PriceGap(price=100, trend="Equal")), 100, True],
+]
+
+
+@pytest.mark.parametrize("cond, close, expected", testcase_crossed)
+def test_crossed(cond, close: float, expected: bool):
+    index = ThresholdIndex()
+    index.add(1, compile_condition(cond))
+    res = index.crossed(SimpleNamespace(close=close))
+    assert bool(res) == expected
+
+
+def test_crossed_matches_scan():
+    rnd = random.Random(7)
+    index = ThresholdIndex()
+    compiled = []
+    for cid in range(1, 500):
+        cond = gaps(
+            close=PriceGap(price=rnd.randint(90, 110), trend=rnd.choice(list(Trend))),
+            volume=QtyGap(qty=rnd.randint(1, 5), trend=rnd.choice(list(Trend)))
+            if rnd.random() < 0.3
+            else None,
+        )
+        compiled.append(compile_condition(cond))
+        index.add(cid, compiled[-1])
+    for _ in range(200):
+        info = SimpleNamespace(close=rnd.randint(85, 115), volume=rnd.randint(1, 5))
+        expected = [c for c in compiled if c.cid in index.entries and c(info)]
+        res = [c for c in index.crossed(info) if c(info)]
+        assert res == expected
+        for c in res[:3]:
+            index.remove(c.cid)
+
+
+def test_pending():
+    index = ThresholdIndex()
+    index.add(1, compile_condition(gaps(close=PriceGap(price=100, trend="Equal"))))
+    info = SimpleNamespace(close=100, buy_price=99)
+    assert not index.crossed(info, ("buy_price",))
+    assert [c.cid for c in index.crossed(info, ("buy_price",), pending=True)] == [1]
+    assert not index.crossed(info, ("buy_price",), pending=True)
+    index.add(2, compile_condition(gaps(close=PriceGap(price=100, trend="Up"))))
+    index.remove(2)
+    assert not index.pending
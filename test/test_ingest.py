@@ -0,0 +1,151 @@
+import time
+import threading
+import pytest
+from types import SimpleNamespace
+from touchprice import IngestBuffer, Overflow
+
+
+def quote(code: str, close: int, volume: int = 1, tick_type: int = 1, simtrade=0):
+    return SimpleNamespace(
+        code=code, close=close, volume=volume, tick_type=tick_type, simtrade=simtrade
+    )
+
+
+def traded(tick, carry) -> int:
+    return tick.volume + (carry.volume if carry else 0)
+
+
+testcase_overflow = [
+    [Overflow.DropOldest, [("A", 2, 1), ("A", 3, 1), ("B", 4, 1)], 2, 0],
+    [Overflow.Conflate, [("A", 3, 3), ("B", 4, 2)], 0, 3],
+]
+
+
+@pytest.mark.parametrize("policy, handled, dropped, conflated", testcase_overflow)
+def test_overflow(
+    policy: Overflow, handled, dropped: int, conflated: int, wait_for
+):
+    gate = threading.Event()
+    ticks = []
+
+    def on_tick(exchange, tick, carry=None):
+        gate.wait()
+        ticks.append((tick.code, tick.close, traded(tick, carry)))
+
+    ingest = IngestBuffer(on_tick, on_tick, size=3, policy=policy)
+    ingest.put_tick(None, quote("A", 0))
+    assert wait_for(lambda: ingest._busy)
+    for code, close in [("A", 1), ("B", 1), ("A", 2), ("A", 3), ("B", 4)]:
+        ingest.put_tick(None, quote(code, close))
+    assert ingest.depth == len(handled)
+    gate.set()
+    assert ingest.join(timeout=5)
+    assert ticks == [("A", 0, 1)] + handled
+    snapshot = ingest.snapshot()
+    assert snapshot["received"] == 6
+    assert snapshot["dropped"] == dropped
+    assert snapshot["conflated"] == conflated
+    assert snapshot["depth"] == 0
+    ingest.close()
+    assert not ingest.thread.is_alive()
+
+
+def test_block(wait_for):
+    gate = threading.Event()
+    ticks = []
+
+    def on_tick(exchange, tick):
+        gate.wait()
+        ticks.append(tick.close)
+
+    ingest = IngestBuffer(on_tick, on_tick, size=2, policy=Overflow.Block)
+    ingest.put_tick(None, quote("A", 0))
+    assert wait_for(lambda: ingest._busy)
+    feed = threading.Thread(
+        target=lambda: [ingest.put_tick(None, quote("A", close)) for close in (1, 2, 3)]
+    )
+    feed.start()
+    assert wait_for(lambda: ingest.depth == 2)
+    time.sleep(0.05)
+    assert feed.is_alive()
+    gate.set()
+    feed.join(5)
+    assert ingest.join(timeout=5)
+    assert ticks == [0, 1, 2, 3]
+    assert ingest.snapshot()["dropped"] == 0
+    assert ingest.max_depth == 2
+    ingest.close()
+
+
+def test_conflate_full(wait_for):
+    gate = threading.Event()
+    ticks = []
+
+    def on_tick(exchange, tick, carry=None):
+        gate.wait()
+        ticks.append((tick.code, tick.close, traded(tick, carry)))
+
+    ingest = IngestBuffer(on_tick, on_tick, size=2, policy=Overflow.Conflate)
+    ingest.put_tick(None, quote("A", 0))
+    assert wait_for(lambda: ingest._busy)
+    ingest.put_tick(None, quote("A", 1))
+    ingest.put_tick(None, quote("B", 1))
+    feed = threading.Thread(target=ingest.put_tick, args=(None, quote("C", 1)))
+    feed.start()
+    time.sleep(0.05)
+    # every pending quote is the only one of its code, C waits for room
+    assert feed.is_alive()
+    ingest.put_tick(None, quote("A", 2))
+    gate.set()
+    feed.join(5)
+    assert ingest.join(timeout=5)
+    assert ticks == [("A", 0, 1), ("A", 2, 2), ("B", 1, 1), ("C", 1, 1)]
+    assert ingest.snapshot()["dropped"] == 0
+    ingest.close()
+
+
+def test_conflate_carry(wait_for):
+    gate = threading.Event()
+    ticks = []
+
+    def on_tick(exchange, tick, carry=None):
+        gate.wait()
+        ticks.append((tick.close, tick.volume, tick.simtrade, carry))
+
+    ingest = IngestBuffer(on_tick, on_tick, size=4, policy=Overflow.Conflate)
+    ingest.put_tick(None, quote("A", 0))
+    assert wait_for(lambda: ingest._busy)
+    for tick in [
+        quote("A", 100, volume=5, tick_type=1),
+        quote("A", 101, volume=9, simtrade=1),
+        quote("A", 102, volume=2, tick_type=2),
+        quote("A", 103, volume=1, tick_type=1),
+        quote("A", 104, volume=9, simtrade=1),
+    ]:
+        ingest.put_tick(None, tick)
+    gate.set()
+    assert ingest.join(timeout=5)
+    assert [tick[:3] for tick in ticks] == [(0, 1, 0), (103, 1, 0), (104, 9, 1)]
+    assert ticks[0][3] is None and ticks[2][3] is None
+    carry = ticks[1][3]
+    assert (carry.ask, carry.ask_reset, carry.bid, carry.bid_reset) == (0, True, 2, True)
+    assert (carry.volume, carry.amount, carry.ticks) == (7, 704.0, 2)
+    ingest.close()
+
+
+def test_handler_error(caplog):
+    ticks = []
+
+    def on_tick(exchange, tick):
+        if tick.close == 1:
+            raise ValueError(tick.close)
+        ticks.append(tick.close)
+
+    ingest = IngestBuffer(on_tick, on_tick, size=4)
+    for close in (0, 1, 2):
+        ingest.put_tick(None, quote("A", close))
+    assert ingest.join(timeout=5)
+    assert ticks == [0, 2]
+    assert ingest.errors == 1
+    assert "ValueError: 1" in caplog.text
+    ingest.close()
@@ -0,0 +1,85 @@
+import random
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+from shioaji.contracts import Future
+from shioaji.order import Order
+from touchprice import (
+    TouchOrderExecutor,
+    StoreCond,
+    PriceGap,
+    QtyGap,
+    StatusInfo,
+    Trend,
+)
+
+np = pytest.importorskip("numpy")
+
+
+def executor(mocker, contract: Future, order: Order, seed: int):
+    rnd = random.Random(seed)
+    touch_order = TouchOrderExecutor(mocker.MagicMock())
+    touch_order.infos = {
+        "TXFC0": StatusInfo(
+            close=100,
+            buy_price=100,
+            sell_price=101,
+            high=100,
+            low=100,
+            change_price=0,
+            change_rate=0,
+            volume=1,
+            total_volume=10,
+            ask_volume=3,
+        )
+    }
+    for _ in range(60):
+        gaps = dict(
+            close=PriceGap(price=rnd.randint(90, 110), trend=rnd.choice(list(Trend)))
+        )
+        if rnd.random() < 0.3:
+            gaps["ask_volume"] = QtyGap(
+                qty=rnd.randint(1, 12), trend=rnd.choice(list(Trend))
+            )
+        if rnd.random() < 0.2:
+            gaps["high"] = PriceGap(price=rnd.randint(100, 110), trend="Up")
+        touch_order._store_condition(
+            "TXFC0", StoreCond(order_contract=contract, order=order, **gaps)
+        )
+    return touch_order
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_replay_matches_streaming(mocker, contract: Future, order: Order, seed: int):
+    rnd = np.random.default_rng(seed)
+    size = 300
+    close = 100 + np.cumsum(rnd.integers(-1, 2, size))
+    high = np.maximum.accumulate(np.maximum(close, 100))
+    low = np.minimum.accumulate(np.minimum(close, 100))
+    volume = rnd.integers(1, 4, size)
+    tick_type = rnd.integers(0, 3, size)
+
+    batch = executor(mocker, contract, order, seed)
+    res = batch.replay("TXFC0", close, high, low, volume, tick_type)
+
+    stream = executor(mocker, contract, order, seed)
+    fired = {}
+    stream.place_order = lambda store, *args: fired.setdefault(
+        store.predicate.cid, num
+    )
+    for num in range(size):
+        stream.integration_tick(
+            None,
+            SimpleNamespace(
+                code="TXFC0",
+                close=Decimal(int(close[num])),
+                high=Decimal(int(high[num])),
+                low=Decimal(int(low[num])),
+                total_volume=int(10 + volume[: num + 1].sum()),
+                volume=int(volume[num]),
+                tick_type=int(tick_type[num]),
+                simtrade=0,
+            ),
+        )
+    assert len(res) == 60
+    assert {cid: num for cid, num in res.items() if num >= 0} == fired
@@ -0,0 +1,45 @@
+import pytest
+import random
+from pydantic import ValidationError
+from touchprice import Rolling
+from touchprice.rolling import RollingWindow, RollingFields
+
+
+def test_rolling_window_matches_scan():
+    rnd = random.Random(5)
+    window = RollingWindow(10)
+    ticks = []
+    ts = 1000.0
+    for _ in range(2000):
+        ts += rnd.choice([0, 0.3, 1.5, 4, 25])
+        price, volume = rnd.randint(90, 110), rnd.randint(1, 9)
+        window.update(ts, price, volume)
+        ticks.append((int(ts), price, volume))
+        live = [t for t in ticks if t[0] > int(ts) - 10]
+        assert window.window_volume == sum(v for _, _, v in live)
+        assert window.tick_rate == pytest.approx(len(live) / 10)
+        assert window.vwap == pytest.approx(
+            sum(p * v for _, p, v in live) / sum(v for _, _, v in live)
+        )
+
+
+def test_rolling_fields():
+    rolling = RollingFields(("close",))
+    rolling.add("vwap:5")
+    rolling.add("tick_rate:5")
+    rolling.add("window_volume:60")
+    assert rolling.fields == ("close", "vwap:5", "tick_rate:5", "window_volume:60")
+    assert sorted(rolling.windows) == [5, 60]
+    rolling.update(100, 10.0, 1)
+    rolling.update(103, 20.0, 3)
+    assert rolling.value("vwap:5") == 17.5
+    rolling.update(106, 30.0, 1)
+    assert rolling.value("vwap:5") == 22.5
+    assert rolling.value("tick_rate:5") == 0.4
+    assert rolling.value("window_volume:60") == 5
+
+
+@pytest.mark.parametrize("seconds", [0, -5])
+def test_rolling_seconds(seconds: int):
+    with pytest.raises(ValidationError):
+        Rolling(value=1.0, seconds=seconds)
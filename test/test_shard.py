@@ -0,0 +1,152 @@
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from shioaji.contracts import Future
+from shioaji.order import Order
+from touchprice import TouchOrderCond, OrderCmd, TouchCmd, Price, CompositeCond
+from touchprice.shard import ShardedTouchOrderExecutor
+
+
+def tick(code: str, close: int):
+    return SimpleNamespace(
+        code=code,
+        close=Decimal(close),
+        high=Decimal(close),
+        low=Decimal(close),
+        total_volume=10,
+        volume=1,
+        tick_type=1,
+        simtrade=0,
+    )
+
+
+def test_sharded_executor(mocker, contract: Future, order: Order, wait_for):
+    api = mocker.MagicMock()
+    api.snapshots = mocker.MagicMock(
+        return_value=[
+            dict(
+                close=100,
+                buy_price=100,
+                sell_price=100,
+                high=100,
+                low=100,
+                change_price=0,
+                change_rate=0,
+                volume=1,
+                total_volume=1,
+            )
+        ]
+    )
+    touch_order = ShardedTouchOrderExecutor(api, shards=2)
+    try:
+        touch_order.contracts = {"TXFC0": contract}
+        up = touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=105, trend="Up")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        down = touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=90, trend="Down")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        touch_order.delete_condition(down)
+        for close in [101, 104, 106, 80, 107]:
+            touch_order.integration_tick(None, tick("TXFC0", close))
+        assert wait_for(lambda: api.place_order.call_count == 1)
+        assert wait_for(lambda: "TXFC0" not in touch_order.refs)
+        assert touch_order.get_condition(up).excuted
+        time.sleep(0.2)
+        assert api.place_order.call_count == 1
+    finally:
+        touch_order.close(timeout=5)
+
+
+def test_sharded_composite(mocker, contract: Future, order: Order):
+    api = mocker.MagicMock()
+    api.snapshots = mocker.MagicMock(
+        side_effect=lambda contracts: [
+            dict(
+                close=100,
+                buy_price=100,
+                sell_price=100,
+                high=100,
+                low=100,
+                change_price=0,
+                change_rate=0,
+                volume=1,
+                total_volume=1,
+            )
+        ]
+        * len(contracts)
+    )
+    touch_order = ShardedTouchOrderExecutor(api, shards=2)
+    try:
+        touch_order.contracts = {
+            "TXFC0": contract,
+            "TXFD0": contract.model_copy(update=dict(code="TXFD0")),
+        }
+        cid = touch_order.add_composite(
+            CompositeCond(
+                touch_cmds=[
+                    TouchCmd(code="TXFC0", close=Price(price=105, trend="Up")),
+                    TouchCmd(code="TXFD0", close=Price(price=95, trend="Down")),
+                ],
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        touch_order.integration_tick(None, tick("TXFC0", 106))
+        assert api.place_order.call_count == 0
+        touch_order.integration_tick(None, tick("TXFD0", 94))
+        assert api.place_order.call_count == 1
+        assert touch_order.get_condition(cid).excuted
+        assert not touch_order.refs
+    finally:
+        touch_order.close(timeout=5)
+
+
+def test_sharded_stale_fire(mocker, contract: Future, order: Order, wait_for):
+    api = mocker.MagicMock()
+    api.snapshots = mocker.MagicMock(
+        return_value=[
+            dict(
+                close=100,
+                buy_price=100,
+                sell_price=100,
+                high=100,
+                low=100,
+                change_price=0,
+                change_rate=0,
+                volume=1,
+                total_volume=1,
+            )
+        ]
+    )
+    touch_order = ShardedTouchOrderExecutor(api, shards=2)
+    try:
+        touch_order.contracts = {"TXFC0": contract}
+        cid = touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=105, trend="Up")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        generation = touch_order._live[cid]
+        assert touch_order.modify_condition(
+            cid,
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=500, trend="Up")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            ),
+        )
+        # a fire of the old thresholds still in flight
+        touch_order.outbox.put(("fire", cid, generation, None))
+        time.sleep(0.2)
+        assert api.place_order.call_count == 0
+        assert not touch_order.get_condition(cid).excuted
+        touch_order.integration_tick(None, tick("TXFC0", 500))
+        assert wait_for(lambda: api.place_order.call_count == 1)
+    finally:
+        touch_order.close(timeout=5)
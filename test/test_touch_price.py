@@ -1,8 +1,11 @@
 import pytest
 import typing
+import threading
 import datetime
 from decimal import Decimal
+from pydantic import ValidationError
 from dataclasses import dataclass
+from types import SimpleNamespace
 from shioaji.account import StockAccount, Account
 from shioaji.contracts import Future, Stock, Contract
 from shioaji.order import Order, Trade, OrderStatus
@@ -22,7 +25,19 @@ from touchprice import (
     Qty,
     QtyGap,
     StoreLossProfit,
+    LossProfitCmd,
+    Trail,
+    Rolling,
+    CompositeCond,
+    SpreadCmd,
+    Logic,
 )
+from touchprice.condition import TAIPEI
+from touchprice.store import QuoteStore, price_scale
+from touchprice.predicate import tick_threshold, COMPARATORS, TICK_FIELDS
+from touchprice.ingest import Carry
+from touchprice.metrics import Histogram
+from touchprice.touch_price import ContractResolver
 
 
 @dataclass
@@ -61,7 +76,7 @@ def touch_order(api):
 
 
 @pytest.fixture()
-def contract():
+def contracts():
     return {
         "TXFC0": Future(
             code="TXFC0",
@@ -129,14 +144,42 @@ testcase_set_price = [
 @pytest.mark.parametrize("price_type, excepted", testcase_set_price)
 def test_set_price(
     touch_order: TouchOrderExecutor,
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     price_type: PriceType,
     excepted: float,
 ):
     price_info = Price(price=9999.0, price_type=price_type, trend="Up")
-    touch_order.contracts = contract
-    res = touch_order.set_price(price_info, contract["TXFC0"])
-    assert res.price == dict(contract["TXFC0"]).get(excepted, price_info.price)
+    touch_order.contracts = contracts
+    res = touch_order.set_price(price_info, contracts["TXFC0"])
+    assert res.price == dict(contracts["TXFC0"]).get(excepted, price_info.price)
+
+
+testcase_contract_resolver = [
+    [None, ["2890", "TXFC0", "2890"], ["2890", "TXFC0"]],
+    [1, ["2890", "TXFC0"], ["TXFC0"]],
+    [2, ["2890", "TXFC0", "2890", "2330"], ["2890", "2330"]],
+]
+
+
+@pytest.mark.parametrize("maxsize, codes, cached", testcase_contract_resolver)
+def test_contract_resolver(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    maxsize: int,
+    codes: typing.List[str],
+    cached: typing.List[str],
+):
+    stocks = mocker.MagicMock(_code2contract={"2890": "2890", "2330": "2330"})
+    futures = mocker.MagicMock(_code2contract=contracts)
+    api = mocker.MagicMock()
+    api.Contracts = [("Stocks", stocks), ("Futures", futures)]
+    resolver = ContractResolver(api, warmup=["2890"], maxsize=maxsize)
+    for code in codes:
+        assert resolver[code] in [code, contracts.get(code)]
+    assert list(resolver.cache) == cached
+    assert "1234" not in resolver
+    with pytest.raises(KeyError):
+        resolver["1234"]
 
 
 testcase_update_snapshot = [["TXFD0", True], ["TXFC0", False]]
@@ -147,7 +190,7 @@ def test_update_snapshot(
     mocker,
     touch_order: TouchOrderExecutor,
     snapshot: Snapshot,
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     code: str,
     in_infos: bool,
 ):
@@ -180,7 +223,7 @@ def test_update_snapshot(
             )
         ]
     )
-    touch_order.update_snapshot(contract["TXFC0"])
+    touch_order.update_snapshot(contracts["TXFC0"])
     if not in_infos:
         assert touch_order.api.snapshots.call_count == 1
 
@@ -201,7 +244,7 @@ testcase_adjust_condition = [
 def test_adjust_condition(
     mocker,
     touch_order: TouchOrderExecutor,
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     order: Order,
     touch_cmd: TouchCmd,
     expected: bool,
@@ -210,7 +253,7 @@ def test_adjust_condition(
         touch_cmd=touch_cmd,
         order_cmd=OrderCmd(code="TXFC0", order=order),
     )
-    touch_order.contracts = contract
+    touch_order.contracts = contracts
     contract = touch_order.contracts["TXFC0"]
     touch_order.set_price = mocker.MagicMock(
         return_value=PriceGap(price=10, trend="Up")
@@ -224,9 +267,13 @@ testcase_set_condition = ["TXFC0", "TXFD0"]
 
 @pytest.mark.parametrize("code", testcase_set_condition)
 def test_add_condition(
-    mocker, contract: Future, order: Order, touch_order: TouchOrderExecutor, code: str
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    touch_order: TouchOrderExecutor,
+    code: str,
 ):
-    touch_order.contracts = {"TXFC0": contract["TXFC0"], "TXFD0": contract["TXFC0"]}
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"], "TXFD0": contracts["TXFC0"]}
     store_cond = StoreCond(
         close=PriceGap(price=10, trend="Up"),
         order_contract=touch_order.contracts["TXFC0"],
@@ -236,7 +283,7 @@ def test_add_condition(
         touch_cmd=TouchCmd(code=code, close=Price(price=10, trend="Up")),
         order_cmd=OrderCmd(code="TXFC0", order=order),
     )
-    touch_order.conditions = {"TXFC0": [store_cond]}
+    touch_order.conditions = {"TXFC0": {1: store_cond}}
     touch_order.update_snapshot = mocker.MagicMock()
     touch_order.adjust_condition = mocker.MagicMock()
     touch_order.add_condition(condition)
@@ -280,41 +327,221 @@ def test_touch_cond(
     assert res == expected
 
 
-testcase_delete_condition = [["TXFC0", 0], ["TXFD0", 1]]
+testcase_add_conditions = [[500, 1], [1, 2]]
+
+
+@pytest.mark.parametrize("chunk, snapshots_count", testcase_add_conditions)
+def test_add_conditions(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+    chunk: int,
+    snapshots_count: int,
+):
+    mocker.patch("touchprice.touch_price.SNAPSHOT_CHUNK", chunk)
+    txfd0 = contracts["TXFC0"].model_copy(update=dict(code="TXFD0"))
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"], "TXFD0": txfd0}
+    touch_order.api.snapshots = mocker.MagicMock(
+        side_effect=lambda contracts: [snapshot] * len(contracts)
+    )
+    conditions = [
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code=code, close=Price(price=price, trend="Up")),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+        for code in ["TXFC0", "TXFD0"]
+        for price in [10, 11, 12]
+    ]
+    conditions.append(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0"),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    report = touch_order.add_conditions(conditions)
+    assert touch_order.api.snapshots.call_count == snapshots_count
+    assert touch_order.api.quote.subscribe.call_count == 4
+    assert report.ids[-1] is None
+    assert len(set(report.ids[:-1])) == 6
+    assert set(report.timings) == {"group", "snapshot", "store", "subscribe", "total"}
+    assert len(touch_order.conditions["TXFD0"]) == 3
+
+
+def test_quote_store():
+    infos = QuoteStore()
+    info = StatusInfo(
+        close=Decimal("590.5"),
+        buy_price=590,
+        sell_price=591,
+        high=593,
+        low=587,
+        change_price=1,
+        change_rate=0.17,
+        volume=3,
+        total_volume=14498,
+        ask_volume=7,
+    )
+    infos["2890"] = info
+    infos["2330"] = info
+    assert infos["2890"].model_dump() == info.model_dump()
+    with pytest.raises(ValidationError):
+        infos["2890"].close = 1
+    assert infos.row("2330").close == 59050
+    assert infos.row("2330").scale == 100
+    infos.row("2330").ask_volume = 10
+    assert infos.pop("2890").model_dump() == info.model_dump()
+    assert "2890" not in infos
+    infos["1101"] = info
+    assert infos.slots["1101"] == 0
+    assert infos["2330"].ask_volume == 10
+    assert len(infos.columns["close"]) == 2
+
+
+testcase_compile_condition = [
+    [dict(close=PriceGap(price=11, trend="Up")), dict(close=10), False],
+    [dict(close=PriceGap(price=11, trend="Up")), dict(close=11), True],
+    [dict(close=PriceGap(price=11, trend="Down")), dict(close=12), False],
+    [dict(close=PriceGap(price=11.1, trend="Equal")), dict(close=Decimal("11.1")), True],
+    [
+        dict(close=PriceGap(price=11, trend="Up"), volume=QtyGap(qty=5, trend="Up")),
+        dict(close=12, volume=4),
+        False,
+    ],
+    [
+        dict(low=PriceGap(price=10, trend="Down"), bid_volume=QtyGap(qty=5, trend="Equal")),
+        dict(low=10, bid_volume=5),
+        True,
+    ],
+]
+
+
+testcase_tick_threshold = [
+    [10.15, "Up", 100, 1015],
+    [10.151, "Up", 100, 1016],
+    [10.159, "Down", 100, 1015],
+    [10.15, "Equal", 100, 1015],
+    [10.155, "Equal", 100, 1015.5],
+    [0.3, "Equal", 10, 3],
+]
+
+
+@pytest.mark.parametrize("price, trend, scale, ticks", testcase_tick_threshold)
+def test_tick_threshold(price: float, trend: Trend, scale: int, ticks: float):
+    threshold = tick_threshold(price, COMPARATORS[Trend(trend)], scale)
+    assert threshold == ticks
+    assert isinstance(threshold, int) == (ticks == int(ticks))
+
+
+testcase_price_scale = [
+    [dict(reference=9823.0, limit_up=10805.0, limit_down=8841.0), 100],
+    [dict(reference=25.55, limit_up=28.1, limit_down=23.0), 100],
+    [dict(reference=0.125, limit_up=0.2, limit_down=0.05), 1000],
+]
+
+
+@pytest.mark.parametrize("prices, scale", testcase_price_scale)
+def test_price_scale(prices: typing.Dict, scale: int):
+    assert price_scale(SimpleNamespace(**prices)) == scale
+
+
+@pytest.mark.parametrize("gaps, values, expected", testcase_compile_condition)
+def test_compile_condition(
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    gaps: typing.Dict,
+    values: typing.Dict,
+    expected: bool,
+):
+    store_cond = StoreCond(order_contract=contracts["TXFC0"], order=order, **gaps)
+    info = dict(
+        close=11,
+        buy_price=11,
+        sell_price=11,
+        high=11,
+        low=11,
+        change_price=1,
+        change_rate=1.0,
+        volume=1,
+        total_volume=10,
+    )
+    info.update(values)
+    infos = QuoteStore()
+    infos["TXFC0"] = StatusInfo(**info)
+    compiled = store_cond.predicate.to_ticks(infos.row("TXFC0").scale)
+    assert compiled(infos.row("TXFC0")) == expected
+    assert store_cond.predicate is compiled.to_ticks(1)
+
+
+testcase_delete_condition = [
+    [11.0, False, 0],
+    [12.0, False, 1],
+    [11.0, True, 0],
+    [12.0, True, 0],
+]
 
 
-@pytest.mark.parametrize("contract_code, condition_len", testcase_delete_condition)
+@pytest.mark.parametrize("price, by_id, condition_len", testcase_delete_condition)
 def test_delete_condition(
     mocker,
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     order: Order,
     touch_order: TouchOrderExecutor,
-    contract_code: str,
+    price: float,
+    by_id: bool,
     condition_len: int,
 ):
-    touch_order.contracts = contract
-    touch_cond = TouchOrderCond(
+    touch_order.contracts = contracts
+    touch_order.update_snapshot = mocker.MagicMock()
+    stored_cond = TouchOrderCond(
         touch_cmd=TouchCmd(
             code="TXFC0",
             close=Price(price=11.0, price_type="LimitPrice", trend="Up"),
         ),
         order_cmd=OrderCmd(code="TXFC0", order=order),
     )
-    touch_order.conditions = {
-        contract_code: [
-            StoreCond(
-                price=PriceGap(price=11.0, trend="Up"),
-                order_contract=touch_order.contracts["TXFC0"],
-                order=touch_cond.order_cmd.order,
-                excuted=False,
-            )
-        ]
-    }
-    touch_order.adjust_condition = mocker.MagicMock(
-        return_value=touch_order.conditions[contract_code][0]
+    touch_cond = TouchOrderCond(
+        touch_cmd=TouchCmd(
+            code="TXFC0",
+            close=Price(price=price, price_type="LimitPrice", trend="Up"),
+        ),
+        order_cmd=OrderCmd(code="TXFC0", order=order),
+    )
+    cid = touch_order.add_condition(stored_cond)
+    touch_order.adjust_condition = mocker.MagicMock()
+    res = touch_order.delete_condition(cid if by_id else touch_cond)
+    touch_order.adjust_condition.assert_not_called()
+    assert len(touch_order.conditions["TXFC0"]) == condition_len
+    assert (touch_order.get_condition(cid) is None) == (res is not None)
+    assert len(touch_order.index.get("TXFC0", [])) == condition_len
+    assert touch_order.api.quote.unsubscribe.call_count == (0 if condition_len else 2)
+    assert ("TXFC0" in touch_order.subscribed) == bool(condition_len)
+
+
+def test_modify_condition(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.contracts = contracts
+    touch_order.update_snapshot = mocker.MagicMock()
+    cid = touch_order.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0", close=Price(price=11.0, trend="Up")),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
     )
-    touch_order.delete_condition(touch_cond)
-    assert len(touch_order.conditions[contract_code]) == condition_len
+    modified = TouchOrderCond(
+        touch_cmd=TouchCmd(code="TXFC0", close=Price(price=12.0, trend="Down")),
+        order_cmd=OrderCmd(code="TXFC0", order=order),
+    )
+    assert touch_order.modify_condition(cid, modified) == cid
+    assert touch_order.get_condition(cid).close == PriceGap(price=12.0, trend="Down")
+    assert touch_order.find_condition(modified) == cid
+    assert len(touch_order.conditions["TXFC0"]) == 1
+    assert touch_order.modify_condition(cid + 1, modified) is None
 
 
 testcase_touch = [
@@ -327,7 +554,7 @@ testcase_touch = [
 @pytest.mark.parametrize("code, price, close_price, order_count", testcase_touch)
 def test_touch_storecond(
     mocker,
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     order: Order,
     touch_order: TouchOrderExecutor,
     code: str,
@@ -335,16 +562,15 @@ def test_touch_storecond(
     close_price: float,
     order_count: int,
 ):
-    touch_order.conditions = {
-        "TXFD0": [
-            StoreCond(
-                close=price,
-                order_contract=contract["TXFC0"],
-                order=order,
-                excuted=False,
-            )
-        ]
-    }
+    touch_order._store_condition(
+        "TXFD0",
+        StoreCond(
+            close=price,
+            order_contract=contracts["TXFC0"],
+            order=order,
+            excuted=False,
+        ),
+    )
     touch_order.infos["TXFD0"] = StatusInfo(
         close=close_price,
         buy_price=11,
@@ -360,8 +586,103 @@ def test_touch_storecond(
     assert touch_order.api.place_order.call_count == order_count
 
 
+def test_touch_order_error(
+    mocker,
+    caplog,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.contracts = contracts
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    touch_order.api.place_order = mocker.MagicMock(
+        side_effect=[RuntimeError("rejected"), "trade"]
+    )
+    cids = [
+        touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=price, trend="Up")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        for price in [10440, 10450]
+    ]
+    touch_order.touch("TXFC0")
+    assert touch_order.api.place_order.call_count == 2
+    assert list(touch_order.history) == cids
+    assert not touch_order.conditions["TXFC0"]
+    assert "TXFC0" not in touch_order.refs
+    assert touch_order.api.quote.unsubscribe.call_count == 2
+    assert "place_order failed" in caplog.text
 
 
+def test_touch_release_subscription(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.contracts = contracts
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    first, second = [
+        touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=10450, trend=trend)),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+        for trend in ["Up", "Down"]
+    ]
+    assert touch_order.refs["TXFC0"] == 2
+    touch_order.delete_condition(second)
+    touch_order.touch("TXFC0")
+    assert touch_order.api.place_order.call_count == 1
+    assert touch_order.api.quote.unsubscribe.call_count == 2
+    assert "TXFC0" not in touch_order.infos
+    assert "TXFC0" not in touch_order.refs
+    touch_order.delete_condition(first)
+    assert touch_order.api.quote.unsubscribe.call_count == 2
+
+
+def test_touch_dispatch(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+):
+    api = mocker.MagicMock()
+    api.place_order = mocker.MagicMock(return_value="trade")
+    touch_order = TouchOrderExecutor(api, dispatch_workers=2)
+    touch_order.contracts = contracts
+    conds = [
+        StoreCond(
+            close=PriceGap(price=9985, trend="Up"),
+            order_contract=contracts["TXFC0"],
+            order=order,
+        )
+        for _ in range(3)
+    ]
+    for cond in conds:
+        touch_order._store_condition("TXFD0", cond)
+    touch_order.infos["TXFD0"] = StatusInfo(
+        close=9986,
+        buy_price=11,
+        sell_price=11,
+        high=11,
+        low=11,
+        change_price=11,
+        change_rate=1,
+        volume=1,
+        total_volume=1,
+    )
+    touch_order.touch("TXFD0")
+    touch_order.dispatcher.shutdown()
+    assert api.place_order.call_count == 3
+    assert all(cond.result == "trade" and cond.excuted for cond in conds)
+    assert touch_order.dispatcher.dispatched == 3
+    assert len(touch_order.dispatcher.latencies) == 3
+
 
 testcase_integration_tick = [
     [
@@ -473,6 +794,395 @@ def test_integration_tick(
     assert touch_order.infos["2890"].bid_volume == bid_volume
 
 
+def test_metrics(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+):
+    touch_order = TouchOrderExecutor(mocker.MagicMock(), metrics=True)
+    touch_order.infos = {
+        "2890": StatusInfo(
+            close=11,
+            buy_price=11,
+            sell_price=11,
+            high=11,
+            low=11,
+            change_price=1,
+            change_rate=1.0,
+            volume=1,
+            total_volume=10,
+        )
+    }
+    touch_order._store_condition(
+        "2890",
+        StoreCond(
+            close=PriceGap(price=590, trend="Up"),
+            order_contract=contracts["TXFC0"],
+            order=order,
+        ),
+    )
+    for simtrade in [1, 0]:
+        touch_order.integration_tick(
+            Exchange.TSE,
+            TickSTKv1(
+                "2890",
+                Decimal("590"),
+                Decimal("593"),
+                Decimal("587"),
+                Decimal("590000"),
+                Decimal("8540101000"),
+                1,
+                14498,
+                1,
+                simtrade,
+            ),
+        )
+    snapshot = touch_order.metrics.snapshot()
+    assert snapshot["counters"] == dict(
+        ticks=1, bidasks=0, conditions_evaluated=1, triggers=1, simtrade_dropped=1
+    )
+    assert all(
+        snapshot["latency_ns"][stage]["count"] == 1
+        for stage in ["update", "evaluate", "place_order"]
+    )
+    text = touch_order.metrics.to_prometheus()
+    assert "touchprice_triggers_total 1" in text
+    assert 'touchprice_stage_latency_seconds_count{stage="evaluate"} 1' in text
+
+
+@pytest.mark.parametrize("dispatch_workers", [0, 2])
+def test_trace(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    dispatch_workers: int,
+):
+    traces = []
+    touch_order = TouchOrderExecutor(
+        mocker.MagicMock(),
+        dispatch_workers=dispatch_workers,
+        trace_cb=traces.append,
+    )
+    touch_order.infos = {
+        "2890": StatusInfo(
+            close=11,
+            buy_price=11,
+            sell_price=11,
+            high=11,
+            low=11,
+            change_price=1,
+            change_rate=1.0,
+            volume=1,
+            total_volume=10,
+        )
+    }
+    store_cond = StoreCond(
+        close=PriceGap(price=590, trend="Up"),
+        order_contract=contracts["TXFC0"],
+        order=order,
+    )
+    touch_order._store_condition("2890", store_cond)
+    # naive Taipei time as sent by Shioaji, whatever the host timezone
+    exchange_ts = datetime.datetime.now(TAIPEI).replace(
+        tzinfo=None
+    ) - datetime.timedelta(milliseconds=5)
+    touch_order.integration_tick(
+        Exchange.TSE,
+        mocker.MagicMock(
+            code="2890",
+            close=Decimal("590"),
+            high=Decimal("593"),
+            low=Decimal("587"),
+            volume=1,
+            total_volume=14498,
+            tick_type=1,
+            simtrade=0,
+            datetime=exchange_ts,
+        ),
+    )
+    if touch_order.dispatcher:
+        touch_order.dispatcher.shutdown()
+    trace = store_cond.trace
+    assert traces == [trace]
+    assert touch_order.drain_traces() == [trace]
+    assert not touch_order.traces
+    assert trace.exchange_ts == exchange_ts
+    assert 0 < trace.exchange_latency < 1
+    assert trace.callback_ts <= trace.evaluated_ts <= trace.sent_ts <= trace.placed_ts
+    assert trace.tick_to_order >= trace.exchange_latency
+
+
+testcase_coalesce = [
+    [dict(close=PriceGap(price=593, trend="Up")), [590, 593, 589], 1],
+    [dict(close=PriceGap(price=587, trend="Down")), [590, 586, 589], 1],
+    [dict(close=PriceGap(price=591, trend="Equal")), [590, 592, 589], 0],
+    [dict(close=PriceGap(price=592, trend="Equal")), [590, 592, 589], 1],
+    [dict(close=PriceGap(price=595, trend="Up")), [590, 593, 589], 0],
+    [
+        dict(
+            close=PriceGap(price=593, trend="Up"),
+            buy_price=PriceGap(price=588, trend="Down"),
+        ),
+        [590, 593, 589],
+        1,
+    ],
+    [
+        dict(
+            close=PriceGap(price=593, trend="Up"),
+            buy_price=PriceGap(price=587, trend="Down"),
+        ),
+        [590, 593, 589],
+        0,
+    ],
+    [
+        dict(
+            close=PriceGap(price=589, trend="Up"),
+            buy_price=PriceGap(price=588, trend="Down"),
+        ),
+        [590, 593, 589],
+        1,
+    ],
+]
+
+
+@pytest.mark.parametrize("gaps, closes, order_count", testcase_coalesce)
+def test_coalesce(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    gaps: typing.Dict,
+    closes: typing.List[int],
+    order_count: int,
+):
+    touch_order = TouchOrderExecutor(mocker.MagicMock(), coalesce_window=60)
+    touch_order.infos = {
+        "2890": StatusInfo(
+            close=588,
+            buy_price=588,
+            sell_price=588,
+            high=588,
+            low=588,
+            change_price=1,
+            change_rate=1.0,
+            volume=1,
+            total_volume=10,
+        )
+    }
+    touch_order._store_condition(
+        "2890",
+        StoreCond(order_contract=contracts["TXFC0"], order=order, **gaps),
+    )
+    touch_order._store_condition(
+        "2890",
+        StoreCond(
+            close=PriceGap(price=10000, trend="Up"),
+            order_contract=contracts["TXFC0"],
+            order=order,
+        ),
+    )
+    touch = mocker.spy(touch_order, "touch")
+    for close in [588] + closes:
+        touch_order.integration_tick(
+            Exchange.TSE,
+            TickSTKv1(
+                "2890",
+                Decimal(close),
+                Decimal("593"),
+                Decimal("580"),
+                Decimal("590000"),
+                Decimal("8540101000"),
+                1,
+                14498,
+                1,
+                0,
+            ),
+        )
+    assert touch.call_count == 1
+    assert touch_order.api.place_order.call_count == 0
+    touch_order.flush()
+    assert touch.call_count == 2
+    assert touch_order.api.place_order.call_count == order_count
+    assert not touch_order._windows
+
+
+testcase_coalesce_fields = [
+    [[(100, 1), (101, 6), (100, 1)], 1],
+    [[(101, 1), (100, 6), (100, 1)], 0],
+    [[(100, 1), (100, 1), (101, 6)], 1],
+]
+
+
+@pytest.mark.parametrize("ticks, order_count", testcase_coalesce_fields)
+def test_coalesce_fields(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    ticks: typing.List[typing.Tuple[int, int]],
+    order_count: int,
+):
+    # an AND of fields fires when they held together inside the window
+    touch_order = TouchOrderExecutor(mocker.MagicMock(), coalesce_window=1000)
+    touch_order.infos = {
+        "2890": StatusInfo(
+            close=99,
+            buy_price=99,
+            sell_price=99,
+            high=99,
+            low=99,
+            change_price=1,
+            change_rate=1.0,
+            volume=1,
+            total_volume=10,
+        )
+    }
+    touch_order._store_condition(
+        "2890",
+        StoreCond(
+            close=PriceGap(price=101, trend="Up"),
+            volume=QtyGap(qty=5, trend="Up"),
+            order_contract=contracts["TXFC0"],
+            order=order,
+        ),
+    )
+    for close, volume in [(99, 1)] + ticks:
+        touch_order.integration_tick(
+            Exchange.TSE,
+            TickSTKv1(
+                "2890",
+                Decimal(close),
+                Decimal("101"),
+                Decimal("99"),
+                Decimal("590000"),
+                Decimal("8540101000"),
+                volume,
+                14498,
+                1,
+                0,
+            ),
+        )
+    touch_order.flush()
+    assert touch_order.api.place_order.call_count == order_count
+
+
+testcase_field_dispatch = [["bidask", 1], ["tick", 1]]
+
+
+@pytest.mark.parametrize("kind, evaluated", testcase_field_dispatch)
+def test_field_dispatch(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    kind: str,
+    evaluated: int,
+):
+    touch_order = TouchOrderExecutor(mocker.MagicMock(), metrics=True)
+    touch_order.infos = {
+        "2890": StatusInfo(
+            close=588,
+            buy_price=588,
+            sell_price=588,
+            high=588,
+            low=588,
+            change_price=1,
+            change_rate=1.0,
+            volume=1,
+            total_volume=10,
+        )
+    }
+    for gaps in [
+        dict(close=PriceGap(price=10000, trend="Up")),
+        dict(
+            buy_price=PriceGap(price=1, trend="Up"),
+            close=PriceGap(price=10000, trend="Up"),
+        ),
+        dict(
+            close=PriceGap(price=10000, trend="Down"),
+            volume=QtyGap(qty=100, trend="Up"),
+        ),
+    ]:
+        touch_order._store_condition(
+            "2890",
+            StoreCond(order_contract=contracts["TXFC0"], order=order, **gaps),
+        )
+    # new conditions are evaluated once on the first message of any kind
+    touch_order.touch("2890", fields=())
+    pending = touch_order.metrics.snapshot()["counters"]["conditions_evaluated"]
+    assert pending == 3
+    if kind == "tick":
+        touch_order.integration_tick(
+            Exchange.TSE,
+            TickSTKv1(
+                "2890",
+                Decimal("590"),
+                Decimal("593"),
+                Decimal("587"),
+                Decimal("590000"),
+                Decimal("8540101000"),
+                1,
+                14498,
+                1,
+                0,
+            ),
+        )
+    else:
+        touch_order.integration_bidask(
+            Exchange.TSE,
+            BidAskSTKv1(
+                "2890",
+                [Decimal("589")],
+                [59391],
+                [Decimal("590")],
+                [26355],
+                0,
+            ),
+        )
+    counters = touch_order.metrics.snapshot()["counters"]
+    assert counters["conditions_evaluated"] - pending == evaluated
+    assert counters["triggers"] == 0
+
+
+def test_pending_condition(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"]}
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    touch_order.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(
+                code="TXFC0",
+                close=Price(price=10450, trend="Equal"),
+                total_volume=Qty(qty=70000, trend="Down"),
+            ),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    touch_order.integration_bidask(
+        Exchange.TAIFEX,
+        BidAskSTKv1("TXFC0", [Decimal("10449")], [1], [Decimal("10451")], [1], 0),
+    )
+    assert touch_order.api.place_order.call_count == 1
+
+
+testcase_histogram = [
+    [list(range(1, 101)), 50, 50],
+    [list(range(1, 1001)), 99, 990],
+    [[1000] * 99 + [10 ** 9], 99, 1000],
+]
+
+
+@pytest.mark.parametrize("values, pct, expected", testcase_histogram)
+def test_histogram(values: typing.List[int], pct: float, expected: int):
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    assert abs(histogram.percentile(pct) - expected) <= expected / 8
+    assert histogram.max == max(values)
+
+
 testcase_integration_bidask = [
     [
         Exchange.TSE,
@@ -589,32 +1299,589 @@ def test_integration_bidask(
     assert touch_order.infos["2890"].bid_volume == bid_volume
 
 
-testcase_show_condition = [["", 2], ["TXFC0", 1]]
+testcase_show_condition = [
+    ["", "all", 2],
+    ["TXFC0", "all", 2],
+    ["TXFC0", "active", 1],
+    ["TXFC0", "executed", 1],
+    ["TXFD0", "executed", 0],
+]
 
 
-@pytest.mark.parametrize("code, length", testcase_show_condition)
+@pytest.mark.parametrize("code, status, length", testcase_show_condition)
 def test_show_condition(
-    contract: Future,
+    contracts: typing.Dict[str, Future],
     order: Order,
     code: str,
+    status: str,
     length: int,
     touch_order: TouchOrderExecutor,
 ):
-    touch_order.conditions = {
-        "TXFC0": [
+    for key in ["TXFC0", "TXFC0", "TXFD0"]:
+        touch_order._store_condition(
+            key,
             StoreCond(
                 close=PriceGap(price=9928, trend="Up"),
-                order_contract=contract["TXFC0"],
+                order_contract=contracts["TXFC0"],
                 order=order,
-            )
-        ],
-        "TXFD0": [
+            ),
+        )
+    touch_order._archive(1)
+    assert touch_order.get_condition(1) is not None
+    res = len(touch_order.show_condition(code, status))
+    assert res == length
+
+
+def test_history_size(
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.history_size = 2
+    for _ in range(3):
+        cid = touch_order._store_condition(
+            "TXFC0",
             StoreCond(
                 close=PriceGap(price=9928, trend="Up"),
-                order_contract=contract["TXFC0"],
+                order_contract=contracts["TXFC0"],
                 order=order,
+            ),
+        )
+        touch_order._archive(cid)
+    assert list(touch_order.history) == [2, 3]
+    assert not touch_order.conditions["TXFC0"]
+    assert touch_order.delete_condition(3) is not None
+    assert list(touch_order.history) == [2]
+
+
+def test_journal_recover(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    tmp_path,
+):
+    def make_api():
+        api = mocker.MagicMock()
+        api.Contracts = [("Futures", mocker.MagicMock(_code2contract=contracts))]
+        api.snapshots = mocker.MagicMock(
+            side_effect=lambda contracts: [snapshot] * len(contracts)
+        )
+        return api
+
+    path = str(tmp_path / "conditions.journal")
+    touch_order = TouchOrderExecutor(make_api(), journal_path=path)
+    cids = [
+        touch_order.add_condition(
+            TouchOrderCond(
+                touch_cmd=TouchCmd(code="TXFC0", close=Price(price=price, trend="Up")),
+                order_cmd=OrderCmd(code="TXFC0", order=order),
             )
-        ],
-    }
-    res = len(touch_order.show_condition(code))
-    assert res == length
+        )
+        for price in [10400, 10500, 10600]
+    ]
+    touch_order.integration_tick(
+        Exchange.TAIFEX,
+        TickSTKv1("TXFC0", 10450, 10450, 10450, 0, 0, 1, 1, 1, False),
+    )
+    touch_order.delete_condition(cids[1])
+    touch_order.journal.close()
+
+    api = make_api()
+    recovered = TouchOrderExecutor(api, journal_path=path)
+    assert list(recovered.cond_codes) == [cids[2]]
+    assert recovered.get_condition(cids[2]).close.price == 10600
+    api.quote.subscribe.assert_called_with(contracts["TXFC0"], quote_type="bidask")
+    recovered.integration_tick(
+        Exchange.TAIFEX,
+        TickSTKv1("TXFC0", 10450, 10450, 10450, 0, 0, 1, 1, 1, False),
+    )
+    api.place_order.assert_not_called()
+    recovered.journal.compact()
+    assert recovered.journal.dead == 0
+    last = recovered.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0", close=Price(price=1, trend="Up")),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    assert last == cids[2] + 1
+    # ids of fired or deleted conditions are not reused after compaction
+    recovered.integration_tick(
+        Exchange.TAIFEX,
+        TickSTKv1("TXFC0", 10450, 10450, 10450, 0, 0, 1, 1, 1, False),
+    )
+    recovered.delete_condition(cids[2])
+    recovered.journal.compact()
+    recovered.journal.close()
+    restarted = TouchOrderExecutor(make_api(), journal_path=path)
+    assert not restarted.cond_codes
+    assert restarted.journal.last_cid == last
+    assert restarted.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0", close=Price(price=1, trend="Up")),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    ) == last + 1
+
+
+def test_journal_recover_bracket(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    tmp_path,
+):
+    txfd0 = contracts["TXFC0"].model_copy(update=dict(code="TXFD0"))
+    codes = {"TXFC0": contracts["TXFC0"], "TXFD0": txfd0}
+
+    def make_api():
+        api = mocker.MagicMock()
+        api.Contracts = [("Futures", mocker.MagicMock(_code2contract=codes))]
+        api.snapshots = mocker.MagicMock(
+            side_effect=lambda contracts: [snapshot] * len(contracts)
+        )
+        return api
+
+    path = str(tmp_path / "conditions.journal")
+    touch_order = TouchOrderExecutor(make_api(), journal_path=path)
+    loss_order = order.model_copy(update=dict(action="Sell"))
+    trade = Trade(
+        contract=contracts["TXFC0"],
+        order=order.model_copy(update=dict(id="abc")),
+        status=OrderStatus(id="abc", status="Filled"),
+    )
+    bracket = touch_order.add_loss_profit(
+        trade,
+        LossProfitCmd(
+            loss_pricegap=PriceGap(price=10300, trend="Down"),
+            loss_order=loss_order,
+            profit_pricegap=PriceGap(price=10600, trend="Up"),
+            profit_order=order,
+        ),
+        excuted_cb=lambda trade: trade,
+    )
+    composite = touch_order.add_composite(
+        CompositeCond(
+            touch_cmds=[TouchCmd(code="TXFD0", close=Price(price=10500, trend="Up"))],
+            spreads=[SpreadCmd("TXFC0", "TXFD0", -100, "Down")],
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    touch_order.journal.close()
+
+    api = make_api()
+    recovered = TouchOrderExecutor(api, journal_path=path)
+    assert sorted(recovered.cond_codes) == [bracket, composite]
+    assert recovered.orders["TXFC0"]["abc"] is recovered.get_condition(bracket)
+    assert recovered.refs == {"TXFC0": 2, "TXFD0": 1}
+    assert set(recovered.graph) == {"TXFC0", "TXFD0"}
+    for code, close in [("TXFD0", 10500), ("TXFC0", 10300)]:
+        recovered.integration_tick(
+            Exchange.TAIFEX,
+            TickSTKv1(code, close, close, close, 0, 0, 1, 1, 1, False),
+        )
+    assert api.place_order.call_args_list == [
+        mocker.call(contracts["TXFC0"], loss_order, cb=print),
+        mocker.call(contracts["TXFC0"], order, cb=print),
+    ]
+    assert not recovered.cond_codes
+    assert not recovered.journal.live
+
+
+testcase_add_loss_profit = [[10300, 0], [10600, 1], [10450, None]]
+
+
+@pytest.mark.parametrize("close, leg", testcase_add_loss_profit)
+def test_add_loss_profit(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+    close: float,
+    leg: typing.Optional[int],
+):
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    loss_order = order.model_copy(update=dict(action="Sell", price_type="MKT"))
+    profit_order = order.model_copy(update=dict(action="Sell", price=10600))
+    trade = Trade(
+        contract=contracts["TXFC0"],
+        order=order.model_copy(update=dict(id="abc")),
+        status=OrderStatus(id="abc", status="Filled"),
+    )
+    cid = touch_order.add_loss_profit(
+        trade,
+        LossProfitCmd(
+            loss_pricegap=PriceGap(price=10300, trend="Down"),
+            loss_order=loss_order,
+            profit_pricegap=PriceGap(price=10600, trend="Up"),
+            profit_order=profit_order,
+        ),
+    )
+    assert touch_order.orders["TXFC0"]["abc"] is touch_order.get_condition(cid)
+    assert len(touch_order.index["TXFC0"]) == 1
+    touch_order.integration_tick(
+        Exchange.TAIFEX,
+        TickSTKv1("TXFC0", close, close, close, 0, 0, 1, 1, 1, False),
+    )
+    if leg is None:
+        touch_order.api.place_order.assert_not_called()
+        assert touch_order.delete_condition(cid) is not None
+    else:
+        touch_order.api.place_order.assert_called_once_with(
+            contracts["TXFC0"], [loss_order, profit_order][leg], cb=print
+        )
+        assert touch_order.get_condition(cid).excuted
+    assert not touch_order.orders
+    assert "TXFC0" not in touch_order.index
+    touch_order.api.quote.unsubscribe.assert_called_with(
+        contracts["TXFC0"], quote_type="bidask"
+    )
+
+
+def test_trail_condition(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+):
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"]}
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    cid = touch_order.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0", trail=Trail(offset=50)),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    assert touch_order.get_condition(cid).trail.offset == 50
+    assert "TXFC0" not in touch_order.index
+    for close in [10500, 10460]:
+        touch_order.integration_tick(
+            Exchange.TAIFEX,
+            TickSTKv1("TXFC0", close, close, close, 0, 0, 1, 1, 1, False),
+        )
+    touch_order.api.place_order.assert_not_called()
+    touch_order.integration_tick(
+        Exchange.TAIFEX,
+        TickSTKv1("TXFC0", 10450, 10500, 10450, 0, 0, 1, 1, 1, False),
+    )
+    touch_order.api.place_order.assert_called_once()
+    assert "TXFC0" not in touch_order.trails
+
+
+testcase_add_composite = [
+    ["And", False, [("TXFC0", 10470)], 0],
+    ["And", False, [("TXFC0", 10470), ("TXFD0", 10430)], 1],
+    ["Or", False, [("TXFD0", 10430)], 1],
+    ["And", True, [("TXFC0", 10470)], 0],
+    ["Or", True, [("TXFC0", 10470), ("TXFD0", 10435)], 1],
+]
+
+
+@pytest.mark.parametrize("logic, spread, ticks, order_count", testcase_add_composite)
+def test_add_composite(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+    logic: Logic,
+    spread: bool,
+    ticks: typing.List[typing.Tuple[str, float]],
+    order_count: int,
+):
+    txfd0 = contracts["TXFC0"].model_copy(update=dict(code="TXFD0"))
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"], "TXFD0": txfd0}
+    touch_order.api.snapshots = mocker.MagicMock(
+        side_effect=lambda contracts: [snapshot] * len(contracts)
+    )
+    if spread:
+        kwargs = dict(spreads=[SpreadCmd("TXFC0", "TXFD0", 30, "Up")])
+    else:
+        kwargs = dict(
+            touch_cmds=[
+                TouchCmd(code="TXFC0", close=Price(price=10460, trend="Up")),
+                TouchCmd(code="TXFD0", close=Price(price=10440, trend="Down")),
+            ]
+        )
+    cid = touch_order.add_composite(
+        CompositeCond(
+            order_cmd=OrderCmd(code="TXFC0", order=order), logic=logic, **kwargs
+        )
+    )
+    assert set(touch_order.graph) == {"TXFC0", "TXFD0"}
+    assert touch_order.refs == {"TXFC0": 1, "TXFD0": 1}
+    for code, close in ticks:
+        touch_order.integration_tick(
+            Exchange.TAIFEX,
+            TickSTKv1(code, close, close, close, 0, 0, 1, 1, 1, False),
+        )
+    assert touch_order.api.place_order.call_count == order_count
+    if not order_count:
+        touch_order.delete_condition(cid)
+    assert not touch_order.graph
+    assert not touch_order.refs
+    assert touch_order.api.quote.unsubscribe.call_count == 4
+
+
+testcase_composite_spread = [
+    [0.2, "Equal", "100.5", "100.3", 100, 1],
+    [0.2, "Up", "100.5", "100.3", 100, 1],
+    [0.21, "Up", "100.5", "100.3", 100, 0],
+    [-0.2, "Equal", "100.3", "100.5", 100, 1],
+    [0.2001, "Equal", "100.5", "100.2999", 10000, 1],
+    [0.2, "Up", "100.5", "100.2999", 10000, 1],
+    [0.2002, "Up", "100.5", "100.2999", 10000, 0],
+]
+
+
+@pytest.mark.parametrize(
+    "price, trend, close, other_close, other_scale, order_count",
+    testcase_composite_spread,
+)
+def test_composite_spread(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+    price: float,
+    trend: Trend,
+    close: str,
+    other_close: str,
+    other_scale: int,
+    order_count: int,
+):
+    # spreads compare integer ticks, also between codes of different scales
+    reference = 9823.1234 if other_scale == 10000 else 9823.0
+    txfd0 = contracts["TXFC0"].model_copy(
+        update=dict(code="TXFD0", reference=reference)
+    )
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"], "TXFD0": txfd0}
+    touch_order.api.snapshots = mocker.MagicMock(
+        side_effect=lambda contracts: [snapshot] * len(contracts)
+    )
+    touch_order.add_composite(
+        CompositeCond(
+            spreads=[SpreadCmd("TXFC0", "TXFD0", price, trend)],
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    assert touch_order.infos.scale("TXFD0") == other_scale
+    for code, value in [("TXFC0", close), ("TXFD0", other_close)]:
+        value = Decimal(value)
+        touch_order.integration_tick(
+            Exchange.TAIFEX,
+            TickSTKv1(code, value, value, value, 0, 0, 1, 1, 1, False),
+        )
+    assert touch_order.api.place_order.call_count == order_count
+
+
+def test_add_composite_trail(order: Order, touch_order: TouchOrderExecutor):
+    with pytest.raises(ValueError):
+        touch_order.add_composite(
+            CompositeCond(
+                touch_cmds=[TouchCmd(code="TXFC0", trail=Trail(offset=10))],
+                order_cmd=OrderCmd(code="TXFC0", order=order),
+            )
+        )
+    assert not touch_order.graph
+
+
+@pytest.mark.parametrize("composite", [False, True])
+def test_rolling_condition(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+    composite: bool,
+):
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"]}
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    touch_cmd = TouchCmd(
+        code="TXFC0", window_volume=Rolling(10, trend="Up", seconds=30)
+    )
+    order_cmd = OrderCmd(code="TXFC0", order=order)
+    if composite:
+        touch_order.add_composite(
+            CompositeCond(touch_cmds=[touch_cmd], order_cmd=order_cmd)
+        )
+    else:
+        touch_order.add_condition(
+            TouchOrderCond(touch_cmd=touch_cmd, order_cmd=order_cmd)
+        )
+    assert list(touch_order.infos.rolling[0].windows) == [30]
+    start = datetime.datetime(2020, 4, 7, 9, 0, 0)
+    for second, volume in [(0, 4), (20, 4), (40, 4), (45, 4)]:
+        touch_order.integration_tick(
+            Exchange.TAIFEX,
+            SimpleNamespace(
+                code="TXFC0",
+                close=10450,
+                high=10450,
+                low=10450,
+                volume=volume,
+                total_volume=volume,
+                tick_type=1,
+                simtrade=False,
+                datetime=start + datetime.timedelta(seconds=second),
+            ),
+        )
+        assert touch_order.api.place_order.call_count == (second == 45)
+    assert not touch_order.infos.rolling
+
+
+def test_concurrent_ticks(
+    mocker,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+    touch_order: TouchOrderExecutor,
+):
+    txfd0 = contracts["TXFC0"].model_copy(update=dict(code="TXFD0"))
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"], "TXFD0": txfd0}
+    touch_order.api.snapshots = mocker.MagicMock(
+        side_effect=lambda contracts: [snapshot] * len(contracts)
+    )
+    placed = []
+    touch_order.api.place_order = mocker.MagicMock(
+        side_effect=lambda contract, order, cb: placed.append(order)
+    )
+    for code in ["TXFC0", "TXFD0"]:
+        for price in range(10451, 10461):
+            touch_order.add_condition(
+                TouchOrderCond(
+                    touch_cmd=TouchCmd(code=code, close=Price(price=price, trend="Up")),
+                    order_cmd=OrderCmd(code=code, order=order),
+                )
+            )
+    touch_order.add_composite(
+        CompositeCond(
+            touch_cmds=[
+                TouchCmd(code="TXFC0", close=Price(price=10460, trend="Up")),
+                TouchCmd(code="TXFD0", close=Price(price=10460, trend="Up")),
+            ],
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    barrier = threading.Barrier(8)
+
+    def run(code: str):
+        barrier.wait()
+        for close in range(10450, 10470):
+            touch_order.integration_tick(
+                Exchange.TAIFEX,
+                TickSTKv1(code, close, close, close, 0, 0, 1, 1, 1, False),
+            )
+
+    threads = [
+        threading.Thread(target=run, args=(code,))
+        for code in ["TXFC0", "TXFD0"] * 4
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    touch_order.flush()
+    assert len(placed) == 21
+    assert not touch_order.cond_codes
+    assert not touch_order.graph
+    assert not touch_order.refs
+
+
+def test_ingest(
+    mocker,
+    api,
+    contracts: typing.Dict[str, Future],
+    order: Order,
+    snapshot: Snapshot,
+):
+    touch_order = TouchOrderExecutor(api, ingest_size=4, ingest_policy="Conflate")
+    api.quote.set_on_tick_fop_v1_callback.assert_called_with(
+        touch_order.ingest.put_tick
+    )
+    touch_order.contracts = {"TXFC0": contracts["TXFC0"]}
+    touch_order.api.snapshots = mocker.MagicMock(return_value=[snapshot])
+    touch_order.add_condition(
+        TouchOrderCond(
+            touch_cmd=TouchCmd(code="TXFC0", close=Price(price=10460, trend="Up")),
+            order_cmd=OrderCmd(code="TXFC0", order=order),
+        )
+    )
+    for close in [10450, 10460]:
+        touch_order.ingest.put_tick(
+            Exchange.TAIFEX,
+            TickSTKv1("TXFC0", close, close, close, 0, 0, 1, 1, 1, False),
+        )
+    assert touch_order.ingest.join(timeout=5)
+    touch_order.ingest.close()
+    assert touch_order.api.place_order.call_count == 1
+    assert touch_order.ingest.snapshot()["received"] == 2
+
+
+testcase_integration_tick_carry = [
+    [(100, 5, 1), (102, 2, 2), (103, 1, 1)],
+    [(100, 5, 1), (101, 3, 1), (103, 1, 1)],
+    [(100, 5, 2), (101, 3, 0), (103, 4, 2)],
+    [(100, 5, 2), (101, 3, 1), (102, 1, 2), (103, 4, 0)],
+]
+
+
+@pytest.mark.parametrize("ticks", testcase_integration_tick_carry)
+def test_integration_tick_carry(
+    mocker, ticks: typing.List[typing.Tuple[int, int, int]]
+):
+    # a tick carrying the ticks conflated into it ends in the same state
+    exchange_ts = datetime.datetime(2020, 4, 7, 9, 0, 0)
+    executors = []
+    for _ in range(2):
+        touch_order = TouchOrderExecutor(mocker.MagicMock())
+        touch_order.infos = {
+            "2890": StatusInfo(
+                close=99,
+                buy_price=99,
+                sell_price=99,
+                high=99,
+                low=99,
+                change_price=1,
+                change_rate=1.0,
+                volume=1,
+                total_volume=10,
+                ask_volume=7,
+                bid_volume=0,
+            )
+        }
+        rolling = touch_order.infos.rolling_fields("2890", TICK_FIELDS)
+        for key in ["vwap:60", "window_volume:60", "tick_rate:60"]:
+            rolling.add(key)
+        executors.append(touch_order)
+    quotes = [
+        SimpleNamespace(
+            code="2890",
+            close=Decimal(close),
+            high=Decimal(close),
+            low=Decimal(close),
+            volume=volume,
+            total_volume=100,
+            tick_type=tick_type,
+            simtrade=0,
+            datetime=exchange_ts,
+        )
+        for close, volume, tick_type in ticks
+    ]
+    for tick in quotes:
+        executors[0].integration_tick(Exchange.TSE, tick)
+    carry = Carry()
+    for tick in quotes[:-1]:
+        carry.add(tick)
+    executors[1].integration_tick(Exchange.TSE, quotes[-1], carry)
+    sequential, conflated = [touch_order.infos["2890"] for touch_order in executors]
+    assert conflated == sequential
+    assert conflated.volume == ticks[-1][1]
+    for key in ["vwap:60", "window_volume:60", "tick_rate:60"]:
+        assert getattr(executors[1].infos.row("2890"), key) == pytest.approx(
+            getattr(executors[0].infos.row("2890"), key)
+        )
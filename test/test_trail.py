@@ -0,0 +1,82 @@
+import pytest
+import random
+from types import SimpleNamespace
+from touchprice import Trail
+from touchprice.trail import TrailIndex
+from touchprice.predicate import CompiledCond
+
+
+def stop(trail: Trail) -> CompiledCond:
+    return CompiledCond(SimpleNamespace(trail=trail), ())
+
+
+testcase_trail = [
+    [Trail(offset=5), [100, 104, 99.5], False],
+    [Trail(offset=5), [100, 104, 99.5, 110, 105], True],
+    [Trail(offset=2, percent=True), [100, 110, 107.8], True],
+    [Trail(offset=2, percent=True), [100, 110, 107.9], False],
+    [Trail(offset=5, trend="Up"), [100, 96, 101], True],
+    [Trail(offset=5, trend="Up"), [100, 96, 100.5], False],
+    [Trail(offset=1, percent=True, trend="Up"), [100, 90, 90.9], True],
+]
+
+
+@pytest.mark.parametrize("trail, prices, expected", testcase_trail)
+def test_trail_crossed(trail: Trail, prices, expected: bool):
+    index = TrailIndex()
+    index.add(1, stop(trail), prices[0])
+    res = [index.crossed(price) for price in prices[1:]]
+    assert bool(res[-1]) == expected
+    assert not any(res[:-1])
+
+
+def test_trail_merge():
+    index = TrailIndex()
+    for cid in (1, 2, 3):
+        index.add(cid, stop(Trail(offset=cid)), 100)
+    index.add(4, stop(Trail(offset=0.5)), 99)
+    assert index.down.peaks == [99, 100]
+    largest = index.down.groups[1]
+    # a new high merges the smaller group into the largest one
+    assert not index.crossed(100.5)
+    assert index.down.groups == [largest]
+    assert largest.offsets == [(0.5, 4), (1, 1), (2, 2), (3, 3)]
+    # and then moves its peak in place
+    assert not index.crossed(101)
+    assert index.down.groups == [largest]
+    assert index.down.peaks == [101] and largest.peak == 101
+    assert [compiled.cid for compiled in index.crossed(99.5)] == [1, 4]
+
+
+def test_trail_matches_scan():
+    rnd = random.Random(3)
+    index = TrailIndex()
+    stops = {}
+    price = 100.0
+    for step in range(400):
+        price = round(price + rnd.uniform(-1, 1), 2)
+        if step % 2 == 0:
+            trail = Trail(
+                offset=rnd.uniform(0.5, 5),
+                percent=rnd.random() < 0.5,
+                trend=rnd.choice(["Up", "Down"]),
+            )
+            index.add(step, stop(trail), price)
+            stops[step] = [trail, price]
+        expected = set()
+        for cid, (trail, peak) in stops.items():
+            if trail.trend == "Up":
+                peak = stops[cid][1] = min(peak, price)
+                gap = price - peak
+            else:
+                peak = stops[cid][1] = max(peak, price)
+                gap = peak - price
+            if gap > 0 and (
+                gap * 100 / peak >= trail.offset if trail.percent else gap >= trail.offset
+            ):
+                expected.add(cid)
+        res = {compiled.cid for compiled in index.crossed(price)}
+        assert res == expected
+        for cid in expected:
+            index.remove(cid)
+            del stops[cid]
@@ -11,6 +11,22 @@ from .touch_price import (
     StatusInfo,
     Qty,
     QtyGap,
+    Trail,
+    Rolling,
     StoreLossProfit,
+    LossProfitCmd,
+    BatchReport,
+    TriggerTrace,
+    CompositeCond,
+    SpreadCmd,
+    StoreComposite,
+    Logic,
+    Overflow,
 )
 from .core import Base
+from .dispatch import OrderDispatcher, DispatchLatency
+from .shard import ShardedTouchOrderExecutor
+from .aio import AsyncTouchOrderExecutor, TriggerEvent
+from .store import QuoteStore
+from .ingest import IngestBuffer
+from .metrics import Metrics, Histogram
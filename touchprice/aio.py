@@ -0,0 +1,174 @@
+import typing
+import asyncio
+import logging
+import functools
+import shioaji as sj
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from shioaji import TickSTKv1, Exchange, BidAskSTKv1
+from touchprice.condition import TouchOrderCond, CompositeCond, LossProfitCmd
+from touchprice.touch_price import TouchOrderExecutor
+
+log = logging.getLogger(__name__)
+
+
+class TriggerEvent(BaseModel):
+    cid: int
+    code: str
+    condition: typing.Any
+    trade: typing.Any = None
+    error: typing.Optional[str] = None
+
+
+class AsyncTouchOrderExecutor(TouchOrderExecutor):
+    # quotes are evaluated by one task of the event loop, Shioaji callbacks
+    # only hand them over and wait while the quote queue is full
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        queue_size: int = 10000,
+        trigger_size: int = 10000,
+        order_workers: int = 4,
+        **kwargs,
+    ):
+        super().__init__(api, **kwargs)
+        self.queue_size = queue_size
+        self.trigger_size = trigger_size
+        self.pool = ThreadPoolExecutor(
+            max_workers=order_workers, thread_name_prefix="touchprice-order"
+        )
+        self.loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self.quotes: typing.Optional[asyncio.Queue] = None
+        self.triggers: typing.Optional[asyncio.Queue] = None
+        self.pending: typing.Set[asyncio.Task] = set()
+        # events dropped because the consumer let trigger_size events pile up
+        self.dropped_triggers: int = 0
+        self._runner: typing.Optional[asyncio.Task] = None
+        self.api.quote.set_on_tick_stk_v1_callback(self._tick_threadsafe)
+        self.api.quote.set_on_tick_fop_v1_callback(self._tick_threadsafe)
+        self.api.quote.set_on_bidask_stk_v1_callback(self._bidask_threadsafe)
+        self.api.quote.set_on_bidask_fop_v1_callback(self._bidask_threadsafe)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.quotes = asyncio.Queue(maxsize=self.queue_size)
+        self.triggers = asyncio.Queue(maxsize=self.trigger_size)
+        self._runner = self.loop.create_task(self.run())
+
+    async def run(self):
+        quotes = self.quotes
+        while True:
+            kind, exchange, quote = await quotes.get()
+            try:
+                if kind == "tick":
+                    self.integration_tick(exchange, quote)
+                else:
+                    self.integration_bidask(exchange, quote)
+            except Exception:
+                # one bad quote must not stop the runner and block the feed
+                log.exception("quote handler failed on %s", quote.code)
+            finally:
+                quotes.task_done()
+
+    async def put_tick(self, exchange: Exchange, tick: TickSTKv1):
+        await self.quotes.put(("tick", exchange, tick))
+
+    async def put_bidask(self, exchange: Exchange, bidask: BidAskSTKv1):
+        await self.quotes.put(("bidask", exchange, bidask))
+
+    def _tick_threadsafe(self, exchange: Exchange, tick: TickSTKv1):
+        asyncio.run_coroutine_threadsafe(
+            self.put_tick(exchange, tick), self.loop
+        ).result()
+
+    def _bidask_threadsafe(self, exchange: Exchange, bidask: BidAskSTKv1):
+        asyncio.run_coroutine_threadsafe(
+            self.put_bidask(exchange, bidask), self.loop
+        ).result()
+
+    async def _call(self, func: typing.Callable, *args) -> typing.Any:
+        # snapshots and subscriptions block on the network, keep them off the loop
+        return await self.loop.run_in_executor(None, func, *args)
+
+    async def add_condition(self, condition: TouchOrderCond) -> typing.Optional[int]:
+        return await self._call(super().add_condition, condition)
+
+    async def add_conditions(self, conditions: typing.List[TouchOrderCond]):
+        return await self._call(super().add_conditions, conditions)
+
+    async def add_loss_profit(
+        self,
+        trade: sj.order.Trade,
+        cmd: LossProfitCmd,
+        excuted_cb: typing.Callable[[sj.order.Trade], typing.Any] = print,
+    ) -> typing.Optional[int]:
+        return await self._call(super().add_loss_profit, trade, cmd, excuted_cb)
+
+    async def add_composite(self, condition: CompositeCond) -> typing.Optional[int]:
+        return await self._call(super().add_composite, condition)
+
+    async def delete_condition(
+        self, condition: typing.Union[int, TouchOrderCond]
+    ) -> typing.Any:
+        return await self._call(super().delete_condition, condition)
+
+    async def modify_condition(
+        self, cid: int, condition: TouchOrderCond
+    ) -> typing.Optional[int]:
+        return await self._call(super().modify_condition, cid, condition)
+
+    def place_order(
+        self,
+        store: typing.Any,
+        contract: sj.contracts.Contract,
+        order: sj.Order,
+        cb: typing.Callable[[sj.order.Trade], typing.Any],
+    ):
+        self.loop.call_soon_threadsafe(self._spawn, store, contract, order, cb)
+
+    def _spawn(self, store: typing.Any, contract, order, cb):
+        task = self.loop.create_task(self._place(store, contract, order, cb))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _place(self, store: typing.Any, contract, order, cb):
+        event = TriggerEvent(
+            cid=store.predicate.cid, code=contract.code, condition=store
+        )
+        try:
+            await self.loop.run_in_executor(
+                self.pool,
+                functools.partial(
+                    TouchOrderExecutor.place_order, self, store, contract, order, cb
+                ),
+            )
+            event.trade = store.result
+        except Exception as exc:
+            event.error = repr(exc)
+        triggers = self.triggers
+        if triggers.full():
+            triggers.get_nowait()
+            self.dropped_triggers += 1
+        triggers.put_nowait(event)
+
+    async def __aiter__(self) -> typing.AsyncIterator[TriggerEvent]:
+        while True:
+            yield await self.triggers.get()
+
+    async def join(self):
+        # every queued quote evaluated and every order placed
+        await self.quotes.join()
+        await asyncio.sleep(0)  # let orders scheduled by the last quote spawn
+        while self.pending:
+            await asyncio.gather(*list(self.pending))
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        await asyncio.gather(*list(self.pending))
+        self.pool.shutdown(wait=True)
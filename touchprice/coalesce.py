@@ -0,0 +1,62 @@
+import typing
+import datetime
+from touchprice.predicate import COND_FIELDS
+
+
+class Window:
+    # extremes and distinct values of the quote fields seen since the last
+    # evaluation, and the conditions on several fields that held on a message
+    __slots__ = (
+        "row",
+        "held",
+        "high",
+        "low",
+        "seen",
+        "fields",
+        "exchange_ts",
+        "callback_ts",
+        "messages",
+    )
+
+    def __init__(
+        self,
+        row: typing.Any,
+        fields: typing.Iterable[str] = COND_FIELDS,
+        exchange_ts: typing.Optional[datetime.datetime] = None,
+        callback_ts: float = 0,
+    ):
+        self.row = row
+        self.held: typing.Set[int] = set()
+        self.high: typing.Dict[str, float] = {
+            key: getattr(row, key) for key in set(COND_FIELDS).union(fields)
+        }
+        self.low: typing.Dict[str, float] = dict(self.high)
+        self.seen: typing.Dict[str, typing.Set[float]] = {
+            key: {value} for key, value in self.high.items()
+        }
+        self.fields: typing.Set[str] = set(fields)
+        self.exchange_ts = exchange_ts
+        self.callback_ts = callback_ts
+        self.messages: int = 1
+
+    def update(self, row: typing.Any, fields: typing.Iterable[str]):
+        high, low, seen = self.high, self.low, self.seen
+        for key in fields:
+            value = getattr(row, key)
+            if key not in high:
+                high[key] = low[key] = value
+                seen[key] = {value}
+            elif value > high[key]:
+                high[key] = value
+            elif value < low[key]:
+                low[key] = value
+            seen[key].add(value)
+        self.fields.update(fields)
+        self.messages += 1
+
+    def hold(self, conditions: typing.Iterable[typing.Any]):
+        # fields of an AND only count together, checked on every message
+        row, held = self.row, self.held
+        for compiled in conditions:
+            if compiled.cid not in held and compiled(row):
+                held.add(compiled.cid)
@@ -1,9 +1,18 @@
 import typing
 import shioaji as sj
-from pydantic import BaseModel
-from touchprice.constant import Trend, PriceType
+from pydantic import BaseModel, PrivateAttr, Field
+from touchprice.constant import Trend, PriceType, Logic
+from touchprice.predicate import (
+    CompiledCond,
+    BracketCond,
+    CompiledComposite,
+    compile_condition,
+    compile_bracket,
+    compile_composite,
+)
 from typing import Callable
 from decimal import Decimal
+import datetime
 
 
 class PriceGap(BaseModel):
@@ -37,6 +46,26 @@ class Qty(QtyGap):
         super().__init__(**dict(qty=qty, trend=trend))
 
 
+class Rolling(BaseModel):
+    value: float
+    trend: Trend = Trend.Equal
+    seconds: int = Field(default=60, ge=1)  # window length
+
+    def __init__(self, value: float, trend: Trend = Trend.Equal, seconds: int = 60):
+        super().__init__(**dict(value=value, trend=trend, seconds=seconds))
+
+
+class Trail(BaseModel):
+    offset: float
+    percent: bool = False  # offset in percent of the running high or low
+    trend: Trend = Trend.Down  # Down stops below the high, Up above the low
+
+    def __init__(
+        self, offset: float, percent: bool = False, trend: Trend = Trend.Down
+    ):
+        super().__init__(**dict(offset=offset, percent=percent, trend=trend))
+
+
 class TouchCmd(BaseModel):
     code: str
     close: typing.Optional[Price] = None
@@ -48,6 +77,10 @@ class TouchCmd(BaseModel):
     total_volume: typing.Optional[Qty] = None
     ask_volume: typing.Optional[Qty] = None
     bid_volume: typing.Optional[Qty] = None
+    vwap: typing.Optional[Rolling] = None
+    window_volume: typing.Optional[Rolling] = None
+    tick_rate: typing.Optional[Rolling] = None
+    trail: typing.Optional[Trail] = None
 
     def __init__(
         self,
@@ -61,6 +94,10 @@ class TouchCmd(BaseModel):
         total_volume: typing.Optional[Qty] = None,
         ask_volume: typing.Optional[Qty] = None,
         bid_volume: typing.Optional[Qty] = None,
+        vwap: typing.Optional[Rolling] = None,
+        window_volume: typing.Optional[Rolling] = None,
+        tick_rate: typing.Optional[Rolling] = None,
+        trail: typing.Optional[Trail] = None,
     ):
         super().__init__(
             **dict(
@@ -74,6 +111,10 @@ class TouchCmd(BaseModel):
                 total_volume=total_volume,
                 ask_volume=ask_volume,
                 bid_volume=bid_volume,
+                vwap=vwap,
+                window_volume=window_volume,
+                tick_rate=tick_rate,
+                trail=trail,
             )
         )
 
@@ -96,17 +137,6 @@ class LossProfitCmd(BaseModel):
     profit_order: sj.Order = None
 
 
-class StoreLossProfit(BaseModel):
-    loss_close: PriceGap = None
-    profit_close: PriceGap = None
-    order_contract: sj.contracts.Contract
-    loss_order: sj.Order = None
-    profit_order: sj.Order = None
-    result: sj.order.Trade = None
-    excuted_cb: Callable[[sj.order.Trade], sj.order.Trade] = print
-    excuted: bool = False
-
-
 class TouchOrderCond(BaseModel):
     touch_cmd: TouchCmd
     order_cmd: OrderCmd
@@ -124,6 +154,106 @@ class TouchOrderCond(BaseModel):
         )
 
 
+class SpreadCmd(BaseModel):
+    code: str
+    other: str
+    price: float  # close of code minus close of other
+    trend: Trend
+
+    def __init__(self, code: str, other: str, price: float, trend: Trend):
+        super().__init__(**dict(code=code, other=other, price=price, trend=trend))
+
+
+class CompositeCond(BaseModel):
+    touch_cmds: typing.List[TouchCmd] = []
+    spreads: typing.List[SpreadCmd] = []
+    order_cmd: OrderCmd
+    logic: Logic = Logic.And
+
+
+TAIPEI = datetime.timezone(datetime.timedelta(hours=8), "Asia/Taipei")
+
+
+def exchange_timestamp(exchange_ts: datetime.datetime) -> float:
+    # Shioaji quote datetimes are naive Taipei time, not host local time
+    if exchange_ts.tzinfo is None:
+        exchange_ts = exchange_ts.replace(tzinfo=TAIPEI)
+    return exchange_ts.timestamp()
+
+
+class TriggerTrace(BaseModel):
+    code: str
+    exchange_ts: typing.Optional[datetime.datetime] = None  # quote datetime
+    callback_ts: float = 0  # epoch seconds entering the quote callback
+    evaluated_ts: float = 0
+    sent_ts: float = 0  # handed to api.place_order
+    placed_ts: float = 0  # api.place_order returned
+
+    @property
+    def exchange_latency(self) -> typing.Optional[float]:
+        if self.exchange_ts is not None:
+            return self.callback_ts - exchange_timestamp(self.exchange_ts)
+
+    @property
+    def evaluate_latency(self) -> float:
+        return self.evaluated_ts - self.callback_ts
+
+    @property
+    def send_latency(self) -> float:
+        return self.sent_ts - self.evaluated_ts
+
+    @property
+    def tick_to_order(self) -> typing.Optional[float]:
+        if self.exchange_ts is not None:
+            return self.sent_ts - exchange_timestamp(self.exchange_ts)
+
+
+class StoreLossProfit(BaseModel):
+    loss_close: PriceGap = None
+    profit_close: PriceGap = None
+    order_contract: sj.contracts.Contract
+    loss_order: sj.Order = None
+    profit_order: sj.Order = None
+    result: sj.order.Trade = None
+    excuted_cb: Callable[[sj.order.Trade], sj.order.Trade] = print
+    excuted: bool = False
+    trade_id: typing.Optional[str] = None
+    trace: typing.Optional[TriggerTrace] = None
+    _predicate: typing.Optional[BracketCond] = PrivateAttr(default=None)
+
+    @property
+    def predicate(self) -> BracketCond:
+        if self._predicate is None:
+            self._predicate = compile_bracket(self)
+        return self._predicate
+
+
+class StoreComposite(BaseModel):
+    touch_cmds: typing.List[TouchCmd] = []
+    spreads: typing.List[SpreadCmd] = []
+    logic: Logic = Logic.And
+    order_contract: sj.contracts.Contract
+    order: sj.Order
+    result: sj.order.Trade = None
+    excuted_cb: Callable[[sj.order.Trade], sj.order.Trade] = print
+    excuted: bool = False
+    trace: typing.Optional[TriggerTrace] = None
+    _predicate: typing.Optional[CompiledComposite] = PrivateAttr(default=None)
+
+    @property
+    def codes(self) -> typing.Tuple[str, ...]:
+        codes = [cmd.code for cmd in self.touch_cmds]
+        for spread in self.spreads:
+            codes += [spread.code, spread.other]
+        return tuple(dict.fromkeys(codes))
+
+    @property
+    def predicate(self) -> CompiledComposite:
+        if self._predicate is None:
+            self._predicate = compile_composite(self)
+        return self._predicate
+
+
 class StoreCond(BaseModel):
     close: typing.Optional[PriceGap] = None
     buy_price: typing.Optional[PriceGap] = None
@@ -134,15 +264,27 @@ class StoreCond(BaseModel):
     total_volume: typing.Optional[QtyGap] = None
     ask_volume: typing.Optional[QtyGap] = None
     bid_volume: typing.Optional[QtyGap] = None
+    vwap: typing.Optional[Rolling] = None
+    window_volume: typing.Optional[Rolling] = None
+    tick_rate: typing.Optional[Rolling] = None
+    trail: typing.Optional[Trail] = None
     order_contract: sj.contracts.Contract
     order: sj.Order
     result: sj.order.Trade = None
     excuted_cb: Callable[[sj.order.Trade], sj.order.Trade] = print
     excuted: bool = False
+    trace: typing.Optional[TriggerTrace] = None
+    _predicate: typing.Optional[CompiledCond] = PrivateAttr(default=None)
 
     def __repr_args__(self):
         return [(k, v) for k, v in self._iter(to_dict=False, exclude_defaults=True)]
 
+    @property
+    def predicate(self) -> CompiledCond:
+        if self._predicate is None:
+            self._predicate = compile_condition(self)
+        return self._predicate
+
 
 class StatusInfo(BaseModel):
     close: Decimal
@@ -157,3 +299,8 @@ class StatusInfo(BaseModel):
     ask_volume: int = 0
     bid_volume: int = 0
     add_ts: float = 0
+
+
+class BatchReport(BaseModel):
+    ids: typing.List[typing.Optional[int]] = []
+    timings: typing.Dict[str, float] = {}
@@ -7,8 +7,19 @@ class Trend(str, Enum):
     Equal = "Equal"
 
 
+class Logic(str, Enum):
+    And = "And"
+    Or = "Or"
+
+
 class PriceType(str, Enum):
     LimitPrice = "LimitPrice"  # 限價
     LimitUp = "LimitUp"  # 漲停
     Unchanged = "Unchanged"  # 平盤
     LimitDown = "LimitDown"  # 跌停
+
+
+class Overflow(str, Enum):
+    Block = "Block"  # callback waits for room
+    DropOldest = "DropOldest"
+    Conflate = "Conflate"  # keep the latest quote of each code
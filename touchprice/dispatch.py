@@ -0,0 +1,79 @@
+import time
+import typing
+import threading
+import collections
+import shioaji as sj
+from concurrent.futures import Future, ThreadPoolExecutor
+from pydantic import BaseModel
+
+# placed_cb(store, sent_ts, placed_ts) with epoch seconds
+PlacedCallback = typing.Callable[[typing.Any, float, float], None]
+
+
+class DispatchLatency(BaseModel):
+    code: str
+    queued: float  # seconds waiting for a worker
+    place: float  # seconds in api.place_order
+    error: typing.Optional[str] = None
+
+
+class OrderDispatcher:
+    def __init__(self, api: sj.Shioaji, workers: int = 4, history: int = 10000):
+        self.api = api
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="touchprice-order"
+        )
+        self.latencies: typing.Deque[DispatchLatency] = collections.deque(
+            maxlen=history
+        )
+        self.dispatched: int = 0
+        self.failed: int = 0
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        store: typing.Any,
+        contract: sj.contracts.Contract,
+        order: sj.Order,
+        cb: typing.Callable[[sj.order.Trade], typing.Any],
+        placed_cb: typing.Optional[PlacedCallback] = None,
+    ) -> Future:
+        return self.pool.submit(
+            self._place, store, contract, order, cb, placed_cb, time.perf_counter()
+        )
+
+    def _place(
+        self,
+        store: typing.Any,
+        contract: sj.contracts.Contract,
+        order: sj.Order,
+        cb: typing.Callable[[sj.order.Trade], typing.Any],
+        placed_cb: typing.Optional[PlacedCallback],
+        queued_at: float,
+    ) -> sj.order.Trade:
+        start = time.perf_counter()
+        sent_ts = time.time()
+        error = None
+        try:
+            store.result = self.api.place_order(contract, order, cb=cb)
+            return store.result
+        except Exception as exc:
+            error = repr(exc)
+            raise
+        finally:
+            latency = DispatchLatency(
+                code=contract.code,
+                queued=start - queued_at,
+                place=time.perf_counter() - start,
+                error=error,
+            )
+            with self._lock:
+                self.dispatched += 1
+                if error is not None:
+                    self.failed += 1
+                self.latencies.append(latency)
+            if placed_cb is not None:
+                placed_cb(store, sent_ts, time.time())
+
+    def shutdown(self, wait: bool = True):
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,128 @@
+import typing
+import operator
+from bisect import bisect_left, bisect_right, insort
+from touchprice.predicate import CompiledCond
+
+INF = float("inf")
+
+
+class ThresholdIndex:
+    # every condition is kept once per field it reads, in a list sorted by
+    # (threshold, cid) for its trend; removal only drops the live entry and
+    # stale keys are skipped until the lists are compacted; a condition the
+    # quote may already satisfy is pending until the next message of any kind
+    COMPACT_MIN = 32
+
+    def __init__(self):
+        self.up: typing.Dict[str, typing.List[typing.Tuple[float, int]]] = {}
+        self.down: typing.Dict[str, typing.List[typing.Tuple[float, int]]] = {}
+        self.equal: typing.Dict[str, typing.List[typing.Tuple[float, int]]] = {}
+        self.entries: typing.Dict[int, CompiledCond] = {}
+        self.pending: typing.Set[int] = set()
+        # conditions on several fields, checked per message while coalescing
+        self.multi: typing.Dict[int, CompiledCond] = {}
+        self.dead: int = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lists(self, compare: typing.Callable):
+        if compare is operator.ge:
+            return self.up
+        elif compare is operator.le:
+            return self.down
+        return self.equal
+
+    def add(self, cid: int, compiled: CompiledCond):
+        compiled.cid = cid
+        self.entries[cid] = compiled
+        self.pending.add(cid)
+        if len(compiled.fields) > 1:
+            self.multi[cid] = compiled
+        for key, compare, threshold in compiled.fields:
+            insort(self._lists(compare).setdefault(key, []), (threshold, cid))
+
+    def remove(self, cid: int) -> typing.Optional[CompiledCond]:
+        compiled = self.entries.pop(cid, None)
+        if compiled is not None:
+            self.pending.discard(cid)
+            self.multi.pop(cid, None)
+            self.dead += 1
+            if self.dead > max(self.COMPACT_MIN, len(self.entries)):
+                self.compact()
+        return compiled
+
+    def compact(self):
+        entries = self.entries
+        for lists in (self.up, self.down, self.equal):
+            for key in list(lists):
+                keys = [k for k in lists[key] if k[1] in entries]
+                if keys:
+                    lists[key] = keys
+                else:
+                    del lists[key]
+        self.dead = 0
+
+    def _collect(
+        self,
+        hits: typing.Set[int],
+        key: str,
+        high: float,
+        low: float,
+        values: typing.Iterable[float],
+    ):
+        keys = self.up.get(key)
+        if keys:
+            hits.update(cid for _, cid in keys[: bisect_right(keys, (high, INF))])
+        keys = self.down.get(key)
+        if keys:
+            hits.update(cid for _, cid in keys[bisect_left(keys, (low, -INF)) :])
+        keys = self.equal.get(key)
+        if keys:
+            for value in values:
+                hits.update(
+                    cid
+                    for _, cid in keys[
+                        bisect_left(keys, (value, -INF)) : bisect_right(
+                            keys, (value, INF)
+                        )
+                    ]
+                )
+
+    def _entries(
+        self, hits: typing.Set[int], pending: bool
+    ) -> typing.List[CompiledCond]:
+        if pending and self.pending:
+            hits |= self.pending
+            self.pending = set()
+        entries = self.entries
+        return [entries[cid] for cid in sorted(hits) if cid in entries]
+
+    def crossed(
+        self,
+        info: typing.Any,
+        fields: typing.Optional[typing.Iterable[str]] = None,
+        pending: bool = False,
+    ) -> typing.List[CompiledCond]:
+        # only conditions reading one of fields can change, skip the others
+        hits = set()
+        for key in self.keys() if fields is None else fields:
+            value = getattr(info, key)
+            self._collect(hits, key, value, value, (value,))
+        return self._entries(hits, pending)
+
+    def crossed_window(
+        self,
+        window: typing.Any,
+        fields: typing.Optional[typing.Iterable[str]] = None,
+        pending: bool = False,
+    ) -> typing.List[CompiledCond]:
+        hits = set()
+        for key in self.keys() if fields is None else fields:
+            self._collect(
+                hits, key, window.high[key], window.low[key], window.seen[key]
+            )
+        return self._entries(hits, pending)
+
+    def keys(self) -> typing.Set[str]:
+        return set(self.up) | set(self.down) | set(self.equal)
@@ -0,0 +1,171 @@
+import typing
+import logging
+import itertools
+import threading
+import collections
+from functools import partial
+from shioaji import TickSTKv1, Exchange, BidAskSTKv1
+from touchprice.constant import Overflow
+
+log = logging.getLogger(__name__)
+
+Handler = typing.Callable[..., typing.Any]
+
+
+class Carry:
+    # ticks replaced by a conflated tick, folded as integration_tick would:
+    # the ask / bid volume added since the last tick of the other side and
+    # whether there was one, and the totals for rolling windows
+    __slots__ = ("ask", "bid", "ask_reset", "bid_reset", "volume", "amount", "ticks")
+
+    def __init__(self):
+        self.ask: int = 0
+        self.bid: int = 0
+        self.ask_reset: bool = False
+        self.bid_reset: bool = False
+        self.volume: int = 0
+        self.amount: float = 0.0
+        self.ticks: int = 0
+
+    def add(self, tick: typing.Any):
+        volume = tick.volume
+        if tick.tick_type == 1:
+            self.ask += volume
+            self.bid, self.bid_reset = 0, True
+        elif tick.tick_type == 2:
+            self.bid += volume
+            self.ask, self.ask_reset = 0, True
+        self.volume += volume
+        self.amount += float(tick.close) * volume
+        self.ticks += 1
+
+
+class IngestBuffer:
+    # bounded hand-over between the Shioaji callbacks and one drain thread,
+    # a conflated quote keeps the place of the one it replaces
+    def __init__(
+        self,
+        on_tick: Handler,
+        on_bidask: Handler,
+        size: int = 10000,
+        policy: Overflow = Overflow.Block,
+    ):
+        self.on_tick = on_tick
+        self.size = size
+        self.policy = Overflow(policy)
+        self.queue: typing.OrderedDict[
+            typing.Hashable,
+            typing.Tuple[Handler, Exchange, typing.Any, typing.Optional[Carry]],
+        ] = collections.OrderedDict()
+        self.received: int = 0
+        self.dropped: int = 0
+        self.conflated: int = 0
+        self.errors: int = 0
+        self.max_depth: int = 0
+        self.put_tick: typing.Callable[[Exchange, TickSTKv1], None] = partial(
+            self.put, on_tick
+        )
+        self.put_bidask: typing.Callable[[Exchange, BidAskSTKv1], None] = partial(
+            self.put, on_bidask
+        )
+        self._seq = itertools.count()
+        self._busy = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self.thread = threading.Thread(
+            target=self._drain, name="touchprice-ingest", daemon=True
+        )
+        self.thread.start()
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def put(self, handler: Handler, exchange: Exchange, quote: typing.Any):
+        # Conflate always replaces the pending quote of a code and waits like
+        # Block when more codes are pending than the buffer holds; a real tick
+        # is never replaced by a simtrade one and hands its volume on in a Carry
+        queue = self.queue
+        conflate = self.policy == Overflow.Conflate
+        with self._lock:
+            self.received += 1
+            key = (
+                (handler, quote.code, quote.simtrade) if conflate else next(self._seq)
+            )
+            while True:
+                if conflate:
+                    pending = queue.get(key)
+                    if pending is not None:
+                        carry = pending[3]
+                        if handler == self.on_tick and not quote.simtrade:
+                            if carry is None:
+                                carry = Carry()
+                            carry.add(pending[2])
+                        queue[key] = (handler, exchange, quote, carry)
+                        self.conflated += 1
+                        return
+                if len(queue) < self.size:
+                    break
+                if self.policy == Overflow.DropOldest:
+                    queue.popitem(last=False)
+                    self.dropped += 1
+                elif self._closed:
+                    return
+                else:
+                    self._not_full.wait()
+            queue[key] = (handler, exchange, quote, None)
+            if len(queue) > self.max_depth:
+                self.max_depth = len(queue)
+            self._not_empty.notify()
+
+    def _drain(self):
+        queue = self.queue
+        while True:
+            with self._lock:
+                self._busy = False
+                if not queue:
+                    self._idle.notify_all()
+                while not queue and not self._closed:
+                    self._not_empty.wait()
+                if not queue:
+                    return
+                _, (handler, exchange, quote, carry) = queue.popitem(last=False)
+                self._busy = True
+                self._not_full.notify()
+            try:
+                if carry is None:
+                    handler(exchange, quote)
+                else:
+                    handler(exchange, quote, carry)
+            except Exception:
+                log.exception("ingest handler failed on %s", quote.code)
+                with self._lock:
+                    self.errors += 1
+
+    def join(self, timeout: typing.Optional[float] = None) -> bool:
+        # wait until every buffered quote is handled
+        with self._lock:
+            return self._idle.wait_for(
+                lambda: not self.queue and not self._busy, timeout
+            )
+
+    def close(self, timeout: typing.Optional[float] = None):
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        self.thread.join(timeout)
+
+    def snapshot(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return dict(
+                depth=len(self.queue),
+                max_depth=self.max_depth,
+                received=self.received,
+                dropped=self.dropped,
+                conflated=self.conflated,
+                errors=self.errors,
+            )
@@ -0,0 +1,193 @@
+import os
+import mmap
+import struct
+import pickle
+import typing
+from touchprice.constant import Trend
+from touchprice.condition import StoreCond, PriceGap, QtyGap, Trail, Rolling
+from touchprice.predicate import PRICE_FIELDS, COND_FIELDS, ROLLING_FIELDS
+
+HEADER = struct.Struct("<IB")  # payload length, record kind
+CID = struct.Struct("<Q")
+
+
+# fields a restart does not keep, reloaded conditions use print
+TRANSIENT = ("result", "excuted_cb", "excuted", "trace")
+
+
+class ConditionJournal:
+    # append-only log of stored conditions; an EXEC record is written before
+    # the order is sent so a restart never fires the condition again; brackets
+    # and composites are pickled whole, StoreCond as thresholds
+    ADD = 1
+    EXEC = 2
+    DEL = 3
+    META = 4  # highest cid issued, kept by compaction so ids are never reused
+
+    def __init__(self, path: str, fsync: bool = False, compact_min: int = 1024):
+        self.path = path
+        self.fsync = fsync
+        self.compact_min = compact_min
+        self.live: typing.Dict[int, bytes] = {}
+        self.dead: int = 0
+        self.last_cid: int = 0
+        end = self._scan()
+        self.file = open(path, "ab", buffering=0)
+        if self.file.tell() > end:
+            # drop a record torn by a crash in the middle of a write
+            self.file.truncate(end)
+            self.file.seek(end)
+
+    def _scan(self) -> int:
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return 0
+        with open(self.path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buf:
+            size = len(buf)
+            offset = 0
+            while offset + HEADER.size <= size:
+                length, kind = HEADER.unpack_from(buf, offset)
+                end = offset + HEADER.size + length
+                if end > size:
+                    break
+                (cid,) = CID.unpack_from(buf, offset + HEADER.size)
+                self.last_cid = max(self.last_cid, cid)
+                if kind == self.META:
+                    pass
+                elif kind == self.ADD:
+                    if cid in self.live:
+                        self.dead += 1
+                    self.live[cid] = buf[offset + HEADER.size : end]
+                else:
+                    self.dead += 1 + (self.live.pop(cid, None) is not None)
+                offset = end
+            return offset
+
+    def load(
+        self,
+    ) -> typing.Dict[int, typing.Tuple[str, typing.Optional[str], typing.Any]]:
+        # contracts, orders and gaps repeat across conditions, so each is built
+        # once and new conditions are shallow copies of a template
+        templates: typing.Dict[typing.Tuple[bytes, bytes], StoreCond] = {}
+        gaps: typing.Dict[typing.Tuple[str, typing.Any, str], typing.Any] = {}
+        res = {}
+        for cid, payload in sorted(self.live.items()):
+            record = pickle.loads(memoryview(payload)[CID.size :])
+            if len(record) == 4:
+                code, key, model, fields = record
+                res[cid] = (code, key, model.model_construct(**fields))
+                continue
+            code, key, contract, order, fields, trail = record
+            template = templates.get((contract, order))
+            if template is None:
+                template = templates[(contract, order)] = StoreCond.model_construct(
+                    order_contract=pickle.loads(contract), order=pickle.loads(order)
+                )
+            update = dict(order=template.order.model_copy())
+            for field in fields:
+                gap = gaps.get(field)
+                if gap is None:
+                    name, value, trend = field
+                    if name in PRICE_FIELDS:
+                        gap = PriceGap.model_construct(price=value, trend=Trend(trend))
+                    elif name in ROLLING_FIELDS:
+                        gap = Rolling.model_construct(
+                            value=value[0], seconds=value[1], trend=Trend(trend)
+                        )
+                    else:
+                        gap = QtyGap.model_construct(qty=value, trend=Trend(trend))
+                    gaps[field] = gap
+                update[field[0]] = gap
+            if trail is not None:
+                offset, percent, trend = trail
+                update["trail"] = Trail.model_construct(
+                    offset=offset, percent=percent, trend=Trend(trend)
+                )
+            res[cid] = (code, key, template.model_copy(update=update))
+        return res
+
+    def _write(self, kind: int, payload: bytes):
+        self.file.write(HEADER.pack(len(payload), kind) + payload)
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def add(
+        self,
+        cid: int,
+        code: str,
+        key: typing.Optional[str],
+        store_condition: typing.Any,
+    ):
+        if cid in self.live:
+            self.dead += 1
+        self.last_cid = max(self.last_cid, cid)
+        if not isinstance(store_condition, StoreCond):
+            model = type(store_condition)
+            fields = {
+                name: getattr(store_condition, name)
+                for name in model.model_fields
+                if name not in TRANSIENT
+            }
+            payload = CID.pack(cid) + pickle.dumps(
+                (code, key, model, fields), pickle.HIGHEST_PROTOCOL
+            )
+            self.live[cid] = payload
+            self._write(self.ADD, payload)
+            return
+        # only thresholds, contract and order are kept, not callbacks or results
+        gaps = []
+        for name in COND_FIELDS:
+            gap = getattr(store_condition, name)
+            if gap is not None:
+                value = gap.price if name in PRICE_FIELDS else gap.qty
+                gaps.append((name, value, gap.trend.value))
+        for name in ROLLING_FIELDS:
+            gap = getattr(store_condition, name)
+            if gap is not None:
+                gaps.append((name, (gap.value, gap.seconds), gap.trend.value))
+        trail = store_condition.trail
+        if trail is not None:
+            trail = (trail.offset, trail.percent, trail.trend.value)
+        payload = CID.pack(cid) + pickle.dumps(
+            (
+                code,
+                key,
+                pickle.dumps(store_condition.order_contract, pickle.HIGHEST_PROTOCOL),
+                pickle.dumps(store_condition.order, pickle.HIGHEST_PROTOCOL),
+                tuple(gaps),
+                trail,
+            ),
+            pickle.HIGHEST_PROTOCOL,
+        )
+        self.live[cid] = payload
+        self._write(self.ADD, payload)
+
+    def executed(self, cid: int):
+        self._drop(self.EXEC, cid)
+
+    def deleted(self, cid: int):
+        self._drop(self.DEL, cid)
+
+    def _drop(self, kind: int, cid: int):
+        if self.live.pop(cid, None) is not None:
+            self._write(kind, CID.pack(cid))
+            self.dead += 2
+            if self.dead > max(self.compact_min, len(self.live)):
+                self.compact()
+
+    def compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(CID.size, self.META) + CID.pack(self.last_cid))
+            for payload in self.live.values():
+                f.write(HEADER.pack(len(payload), self.ADD) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "ab", buffering=0)
+        self.dead = 0
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,124 @@
+import typing
+import threading
+
+SUB_BITS = 3
+SUB_COUNT = 1 << SUB_BITS
+
+
+def bucket_index(value: int) -> int:
+    # log-linear buckets with 2 ** SUB_BITS steps per power of two
+    if value < 2 * SUB_COUNT:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return shift * SUB_COUNT + (value >> shift)
+
+
+def bucket_value(index: int) -> int:
+    if index < 2 * SUB_COUNT:
+        return index
+    shift = index // SUB_COUNT - 1
+    return (index % SUB_COUNT + SUB_COUNT) << shift
+
+
+class Histogram:
+    def __init__(self):
+        self.counts: typing.Dict[int, int] = {}
+        self.count: int = 0
+        self.total: int = 0
+        self.min: int = 0
+        self.max: int = 0
+
+    def record(self, value: int):
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct: float) -> int:
+        if not self.count:
+            return 0
+        rank = pct / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def snapshot(self) -> typing.Dict[str, float]:
+        return dict(
+            count=self.count,
+            sum=self.total,
+            min=self.min,
+            max=self.max,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            p999=self.percentile(99.9),
+        )
+
+
+class Metrics:
+    STAGES = ("update", "evaluate", "place_order")
+    COUNTERS = (
+        "ticks",
+        "bidasks",
+        "conditions_evaluated",
+        "triggers",
+        "simtrade_dropped",
+    )
+
+    def __init__(self):
+        self.histograms: typing.Dict[str, Histogram] = {
+            stage: Histogram() for stage in self.STAGES
+        }
+        self.counters: typing.Dict[str, int] = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, ns: int):
+        with self._lock:
+            self.histograms[stage].record(ns)
+
+    def incr(self, name: str, num: int = 1):
+        with self._lock:
+            self.counters[name] += num
+
+    def snapshot(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            return dict(
+                counters=dict(self.counters),
+                latency_ns={
+                    stage: histogram.snapshot()
+                    for stage, histogram in self.histograms.items()
+                },
+            )
+
+    def to_prometheus(self, prefix: str = "touchprice") -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+            lines.append("{}_{}_total {}".format(prefix, name, value))
+        name = "{}_stage_latency_seconds".format(prefix)
+        lines.append("# TYPE {} summary".format(name))
+        for stage, stats in snapshot["latency_ns"].items():
+            for quantile in ["p50", "p90", "p99", "p999"]:
+                lines.append(
+                    '{}{{stage="{}",quantile="{}"}} {:.9f}'.format(
+                        name,
+                        stage,
+                        "0." + quantile[1:],
+                        stats[quantile] / 1e9,
+                    )
+                )
+            lines.append(
+                '{}_sum{{stage="{}"}} {:.9f}'.format(name, stage, stats["sum"] / 1e9)
+            )
+            lines.append(
+                '{}_count{{stage="{}"}} {}'.format(name, stage, stats["count"])
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,239 @@
+import typing
+import operator
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from touchprice.constant import Trend, Logic
+
+PRICE_FIELDS = ("close", "buy_price", "sell_price", "high", "low")
+QTY_FIELDS = ("volume", "total_volume", "ask_volume", "bid_volume")
+COND_FIELDS = PRICE_FIELDS + QTY_FIELDS
+# rolling window fields, read as "<name>:<seconds>" from the quote row
+ROLLING_FIELDS = ("vwap", "window_volume", "tick_rate")
+# StatusInfo fields written by integration_tick / integration_bidask
+TICK_FIELDS = ("close", "high", "low") + QTY_FIELDS
+BIDASK_FIELDS = ("buy_price", "sell_price")
+
+# comparator(value, threshold), same decisions as TouchOrderExecutor.touch_cond
+COMPARATORS = {
+    Trend.Up: operator.ge,
+    Trend.Down: operator.le,
+    Trend.Equal: operator.eq,
+}
+
+
+class CompiledCond:
+    __slots__ = ("store", "fields", "cid", "scale")
+
+    def __init__(
+        self,
+        store: typing.Any,
+        fields: typing.Tuple[typing.Tuple[str, typing.Callable, float], ...],
+    ):
+        self.store = store
+        self.fields = fields
+        self.cid: typing.Optional[int] = None
+        self.scale: typing.Optional[int] = None
+
+    def __call__(self, info: typing.Any) -> bool:
+        for key, compare, threshold in self.fields:
+            if not compare(getattr(info, key), threshold):
+                return False
+        return True
+
+    @property
+    def order(self) -> typing.Any:
+        return self.store.order
+
+    def to_ticks(self, scale: int) -> "CompiledCond":
+        # price thresholds in ticks of the quote store, done once per condition
+        if self.scale is None:
+            self.scale = scale
+            self.fields = tuple(
+                (key, compare, tick_threshold(threshold, compare, scale))
+                if key in PRICE_FIELDS
+                else (key, compare, threshold)
+                for key, compare, threshold in self.fields
+            )
+        return self
+
+    def touched(self, window: typing.Any) -> bool:
+        # a single field reached its threshold at some point of a coalescing
+        # window; fields of an AND only count together, on one of its messages
+        if len(self.fields) > 1:
+            return self.cid in window.held or self(window.row)
+        for key, compare, threshold in self.fields:
+            if not reached(window, key, compare, threshold):
+                return False
+        return True
+
+    def __repr__(self):
+        return "CompiledCond({})".format(
+            ", ".join(
+                "{} {} {}".format(key, compare.__name__, threshold)
+                for key, compare, threshold in self.fields
+            )
+        )
+
+
+class BracketCond(CompiledCond):
+    # one-cancels-other legs kept as a single index entry, the first leg
+    # that touches fires the bracket and picks its order
+    __slots__ = ("orders", "leg")
+
+    def __init__(
+        self,
+        store: typing.Any,
+        fields: typing.Tuple[typing.Tuple[str, typing.Callable, float], ...],
+        orders: typing.Tuple[typing.Any, ...],
+    ):
+        super().__init__(store, fields)
+        self.orders = orders
+        self.leg: typing.Optional[int] = None
+
+    def __call__(self, info: typing.Any) -> bool:
+        for leg, (key, compare, threshold) in enumerate(self.fields):
+            if compare(getattr(info, key), threshold):
+                self.leg = leg
+                return True
+        return False
+
+    @property
+    def order(self) -> typing.Any:
+        return self.orders[self.leg]
+
+    def touched(self, window: typing.Any) -> bool:
+        for leg, (key, compare, threshold) in enumerate(self.fields):
+            if reached(window, key, compare, threshold):
+                self.leg = leg
+                return True
+        return False
+
+
+class CompiledComposite(CompiledCond):
+    # legs on several codes read their rows of the shared quote store, a
+    # spread is (code, other, compare, threshold, multiplier, other multiplier)
+    # and compares closes brought to the finer tick of its two codes
+    __slots__ = ("legs", "spreads", "any")
+
+    def __init__(
+        self,
+        store: typing.Any,
+        legs: typing.Tuple[typing.Tuple[str, CompiledCond], ...],
+        spreads: typing.Tuple[
+            typing.Tuple[str, str, typing.Callable, float, int, int], ...
+        ],
+        any_: bool,
+    ):
+        super().__init__(store, ())
+        self.legs = legs
+        self.spreads = spreads
+        self.any = any_
+
+    def __call__(self, infos: typing.Any) -> bool:
+        any_ = self.any
+        for code, compiled in self.legs:
+            if compiled(infos.row(code)) is any_:
+                return any_
+        for code, other, compare, threshold, mult, other_mult in self.spreads:
+            spread = infos.row(code).close * mult - infos.row(other).close * other_mult
+            if compare(spread, threshold) is any_:
+                return any_
+        return not any_
+
+    def to_ticks(self, scale: typing.Callable[[str], int]) -> "CompiledComposite":
+        # scale gives the tick scale of each code, scales are powers of ten
+        if self.scale is None:
+            self.scale = 1
+            for code, compiled in self.legs:
+                compiled.to_ticks(scale(code))
+            spreads = []
+            for code, other, compare, threshold, _, _ in self.spreads:
+                common = max(scale(code), scale(other))
+                spreads.append(
+                    (
+                        code,
+                        other,
+                        compare,
+                        tick_threshold(threshold, compare, common),
+                        common // scale(code),
+                        common // scale(other),
+                    )
+                )
+            self.spreads = tuple(spreads)
+        return self
+
+
+def reached(
+    window: typing.Any, key: str, compare: typing.Callable, threshold: float
+) -> bool:
+    if compare is operator.ge:
+        return window.high[key] >= threshold
+    elif compare is operator.le:
+        return window.low[key] <= threshold
+    return threshold in window.seen[key]
+
+
+def tick_threshold(
+    price: float, compare: typing.Callable, scale: int
+) -> typing.Union[int, float]:
+    # Up rounds up and Down rounds down onto the tick grid, so integer ticks
+    # take the same decisions as the prices; an Equal price off the grid
+    # keeps its fraction and never matches
+    ticks = Decimal(str(price)) * scale
+    if compare is operator.ge:
+        return int(ticks.to_integral_value(ROUND_CEILING))
+    elif compare is operator.le:
+        return int(ticks.to_integral_value(ROUND_FLOOR))
+    return int(ticks) if ticks == ticks.to_integral_value() else float(ticks)
+
+
+def rolling_key(name: str, seconds: int) -> str:
+    return "{}:{}".format(name, seconds)
+
+
+def compile_condition(store_cond: typing.Any) -> CompiledCond:
+    fields = []
+    for key in COND_FIELDS:
+        gap = getattr(store_cond, key, None)
+        if gap is not None:
+            threshold = gap.price if key in PRICE_FIELDS else gap.qty
+            fields.append((key, COMPARATORS[gap.trend], float(threshold)))
+    for key in ROLLING_FIELDS:
+        gap = getattr(store_cond, key, None)
+        if gap is not None:
+            fields.append(
+                (
+                    rolling_key(key, gap.seconds),
+                    COMPARATORS[gap.trend],
+                    float(gap.value),
+                )
+            )
+    return CompiledCond(store_cond, tuple(fields))
+
+
+def compile_bracket(store_lp: typing.Any) -> BracketCond:
+    fields = []
+    orders = []
+    for gap, order in [
+        (store_lp.loss_close, store_lp.loss_order),
+        (store_lp.profit_close, store_lp.profit_order),
+    ]:
+        if gap is not None and order is not None:
+            fields.append(("close", COMPARATORS[gap.trend], float(gap.price)))
+            orders.append(order)
+    return BracketCond(store_lp, tuple(fields), tuple(orders))
+
+
+def compile_composite(store_comp: typing.Any) -> CompiledComposite:
+    legs = tuple((cmd.code, compile_condition(cmd)) for cmd in store_comp.touch_cmds)
+    spreads = tuple(
+        (
+            spread.code,
+            spread.other,
+            COMPARATORS[spread.trend],
+            float(spread.price),
+            1,
+            1,
+        )
+        for spread in store_comp.spreads
+    )
+    return CompiledComposite(store_comp, legs, spreads, store_comp.logic == Logic.Or)
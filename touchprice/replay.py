@@ -0,0 +1,95 @@
+import typing
+import operator
+from touchprice.predicate import CompiledCond, BracketCond
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _running_volume(init: int, volume, hit, reset):
+    # streaming: add volume on hit ticks, set to 0 on reset ticks, else keep
+    total = np.cumsum(np.where(hit, volume, 0))
+    last = np.maximum.accumulate(
+        np.where(reset, np.arange(len(volume)), -1)
+    )
+    return np.where(last >= 0, total - total[np.maximum(last, 0)], init + total)
+
+
+def replay_columns(
+    info: typing.Any,
+    close,
+    high,
+    low,
+    volume,
+    tick_type,
+    total_volume=None,
+    scale: typing.Optional[int] = None,
+) -> typing.Dict[str, typing.Any]:
+    # prices are rounded to integer ticks when scale is given
+    if np is None:
+        raise ImportError("replay needs numpy, pip install touchprice[replay]")
+
+    def prices(values):
+        values = np.asarray(values, dtype=np.float64)
+        return values if scale is None else np.rint(values * scale).astype(np.int64)
+
+    dtype = np.float64 if scale is None else np.int64
+    close = prices(close)
+    volume = np.asarray(volume, dtype=np.int64)
+    tick_type = np.asarray(tick_type)
+    size = len(close)
+    if total_volume is None:
+        total_volume = info.total_volume + np.cumsum(volume)
+    return dict(
+        close=close,
+        high=prices(high),
+        low=prices(low),
+        volume=volume,
+        total_volume=np.asarray(total_volume, dtype=np.int64),
+        ask_volume=_running_volume(
+            info.ask_volume, volume, tick_type == 1, tick_type == 2
+        ),
+        bid_volume=_running_volume(
+            info.bid_volume, volume, tick_type == 2, tick_type == 1
+        ),
+        buy_price=np.full(size, info.buy_price, dtype=dtype),
+        sell_price=np.full(size, info.sell_price, dtype=dtype),
+    )
+
+
+def first_touch(
+    conditions: typing.Iterable[CompiledCond],
+    columns: typing.Dict[str, typing.Any],
+) -> typing.Dict[int, int]:
+    size = len(columns["close"])
+    envelopes: typing.Dict[typing.Tuple[str, typing.Callable], typing.Any] = {}
+    res = {}
+    for compiled in conditions:
+        if any(key not in columns for key, _, _ in compiled.fields):
+            continue  # rolling window fields are not replayed
+        if len(compiled.fields) == 1 and compiled.fields[0][1] is not operator.eq:
+            # a single Up/Down threshold fires where the running max/min crosses it
+            key, compare, threshold = compiled.fields[0]
+            envelope = envelopes.get((key, compare))
+            if envelope is None:
+                if compare is operator.ge:
+                    envelope = np.maximum.accumulate(columns[key])
+                else:
+                    envelope = -np.minimum.accumulate(columns[key])
+                envelopes[(key, compare)] = envelope
+            target = threshold if compare is operator.ge else -threshold
+            num = int(np.searchsorted(envelope, target, side="left"))
+            res[compiled.cid] = num if num < size else -1
+        elif isinstance(compiled, BracketCond):
+            mask = np.zeros(size, dtype=bool)
+            for key, compare, threshold in compiled.fields:
+                mask |= compare(columns[key], threshold)
+            res[compiled.cid] = int(mask.argmax()) if mask.any() else -1
+        else:
+            mask = np.ones(size, dtype=bool)
+            for key, compare, threshold in compiled.fields:
+                mask &= compare(columns[key], threshold)
+            res[compiled.cid] = int(mask.argmax()) if mask.any() else -1
+    return res
@@ -0,0 +1,106 @@
+import typing
+from array import array
+
+
+class RollingWindow:
+    # per second buckets in a ring, totals are kept as buckets enter and leave
+    # so a tick costs O(1) however long the window is
+    __slots__ = (
+        "seconds",
+        "stamps",
+        "volumes",
+        "amounts",
+        "ticks",
+        "volume",
+        "amount",
+        "count",
+        "head",
+    )
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.stamps = array("q", [-1]) * seconds
+        self.volumes = array("q", [0]) * seconds
+        self.amounts = array("d", [0]) * seconds
+        self.ticks = array("q", [0]) * seconds
+        self.volume: int = 0
+        self.amount: float = 0.0
+        self.count: int = 0
+        self.head: int = -1
+
+    def advance(self, now: int):
+        if now <= self.head:
+            return
+        start = max(self.head + 1, now - self.seconds + 1)
+        for second in range(start, now + 1):
+            slot = second % self.seconds
+            if self.stamps[slot] >= 0:
+                self.volume -= self.volumes[slot]
+                self.amount -= self.amounts[slot]
+                self.count -= self.ticks[slot]
+                self.volumes[slot] = 0
+                self.amounts[slot] = 0
+                self.ticks[slot] = 0
+            self.stamps[slot] = second
+        if now - self.head > self.seconds:
+            # every bucket left the window, drop float drift with them
+            self.volume, self.amount, self.count = 0, 0.0, 0
+        self.head = now
+
+    def update(self, ts: float, price: float, volume: int):
+        self.merge(ts, volume, price * volume, 1)
+
+    def merge(self, ts: float, volume: int, amount: float, ticks: int):
+        now = int(ts)
+        self.advance(now)
+        slot = now % self.seconds
+        if self.stamps[slot] != now:
+            return  # older than the window
+        self.volumes[slot] += volume
+        self.amounts[slot] += amount
+        self.ticks[slot] += ticks
+        self.volume += volume
+        self.amount += amount
+        self.count += ticks
+
+    @property
+    def vwap(self) -> float:
+        return self.amount / self.volume if self.volume else 0.0
+
+    @property
+    def window_volume(self) -> int:
+        return self.volume
+
+    @property
+    def tick_rate(self) -> float:
+        return self.count / self.seconds
+
+
+class RollingFields:
+    # rolling windows of one code, only allocated once a condition reads them
+    def __init__(self, base_fields: typing.Tuple[str, ...] = ()):
+        self.base_fields = base_fields
+        self.windows: typing.Dict[int, RollingWindow] = {}
+        self.readers: typing.Dict[str, typing.Tuple[RollingWindow, str]] = {}
+        self.fields: typing.Tuple[str, ...] = base_fields
+
+    def add(self, key: str):
+        if key not in self.readers:
+            name, seconds = key.split(":")
+            window = self.windows.get(int(seconds))
+            if window is None:
+                window = self.windows[int(seconds)] = RollingWindow(int(seconds))
+            self.readers[key] = (window, name)
+            self.fields = self.base_fields + tuple(self.readers)
+
+    def update(self, ts: float, price: float, volume: int):
+        for window in self.windows.values():
+            window.update(ts, price, volume)
+
+    def merge(self, ts: float, volume: int, amount: float, ticks: int):
+        for window in self.windows.values():
+            window.merge(ts, volume, amount, ticks)
+
+    def value(self, key: str) -> float:
+        window, name = self.readers[key]
+        return getattr(window, name)
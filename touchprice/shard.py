@@ -0,0 +1,231 @@
+import zlib
+import typing
+import itertools
+import threading
+import multiprocessing
+import shioaji as sj
+from types import SimpleNamespace
+from shioaji import TickSTKv1, Exchange, BidAskSTKv1
+from touchprice.condition import StoreCond, StoreComposite
+from touchprice.touch_price import TouchOrderExecutor
+
+
+class _NullQuote:
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: None
+
+
+class _ShardApi:
+    Contracts: typing.Tuple = ()
+    quote = _NullQuote()
+
+
+class _ShardWorker(TouchOrderExecutor):
+    # evaluation state of one shard, triggers are sent back to the gateway
+    def __init__(self, outbox: multiprocessing.Queue):
+        super().__init__(_ShardApi())
+        self.outbox = outbox
+        self.generations: typing.Dict[int, int] = {}
+
+    def place_order(self, store: StoreCond, contract, order, cb):
+        compiled = store.predicate
+        self.outbox.put(
+            (
+                "fire",
+                compiled.cid,
+                self.generations.pop(compiled.cid, None),
+                getattr(compiled, "leg", None),
+            )
+        )
+
+    def unsubscribe(self, code: str):
+        pass
+
+
+def _shard_main(inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    worker = _ShardWorker(outbox)
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        kind = msg[0]
+        if kind == "tick":
+            _, code, close, high, low, total_volume, volume, tick_type = msg
+            worker.integration_tick(
+                None,
+                SimpleNamespace(
+                    code=code,
+                    close=close,
+                    high=high,
+                    low=low,
+                    total_volume=total_volume,
+                    volume=volume,
+                    tick_type=tick_type,
+                    simtrade=0,
+                ),
+            )
+        elif kind == "bidask":
+            _, code, bid_price, ask_price, ask_volume = msg
+            worker.integration_bidask(
+                None,
+                SimpleNamespace(
+                    code=code,
+                    bid_price=bid_price,
+                    ask_price=ask_price,
+                    ask_volume=ask_volume,
+                    simtrade=0,
+                ),
+            )
+        elif kind == "info":
+            _, code, info, scale = msg
+            worker.infos.scales[code] = scale
+            worker.infos[code] = info
+        elif kind == "add":
+            _, code, cid, generation, store_condition = msg
+            worker.generations[cid] = generation
+            worker._store_condition(code, store_condition, cid=cid)
+        elif kind == "del":
+            _, cid = msg
+            worker.generations.pop(cid, None)
+            worker._remove_condition(cid)
+        elif kind == "evict":
+            _, code = msg
+            worker.infos.pop(code, None)
+            worker.index.pop(code, None)
+            worker.refs.pop(code, None)
+
+
+class ShardedTouchOrderExecutor(TouchOrderExecutor):
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        shards: int = 2,
+        dispatch_workers: int = 0,
+        mp_context: str = "spawn",
+    ):
+        super().__init__(api, dispatch_workers=dispatch_workers)
+        ctx = multiprocessing.get_context(mp_context)
+        self.outbox: multiprocessing.Queue = ctx.Queue()
+        self.inboxes: typing.List[multiprocessing.Queue] = [
+            ctx.Queue() for _ in range(shards)
+        ]
+        self.processes = [
+            ctx.Process(
+                target=_shard_main,
+                args=(inbox, self.outbox),
+                name="touchprice-shard-{}".format(num),
+                daemon=True,
+            )
+            for num, inbox in enumerate(self.inboxes)
+        ]
+        for process in self.processes:
+            process.start()
+        # cid -> generation of its last add, modify_condition reuses the cid
+        # so a fire of the replaced thresholds is told apart and dropped
+        self._live: typing.Dict[int, int] = {}
+        self._generation = itertools.count(1)
+        self.gateway = threading.Thread(
+            target=self._gateway, name="touchprice-gateway", daemon=True
+        )
+        self.gateway.start()
+
+    def shard_of(self, code: str) -> int:
+        return zlib.crc32(code.encode()) % len(self.inboxes)
+
+    def _send(self, code: str, msg: typing.Tuple):
+        self.inboxes[self.shard_of(code)].put(msg)
+
+    def _set_info(self, code: str, snapshot: typing.Any):
+        super()._set_info(code, snapshot)
+        self._send(
+            code, ("info", code, self.infos[code], self.infos.row(code).scale)
+        )
+
+    def _index_condition(self, code: str, cid: int, store_condition: StoreCond):
+        if isinstance(store_condition, StoreComposite):
+            # legs may live on different shards, composites stay in the gateway
+            super()._index_condition(code, cid, store_condition)
+            return
+        generation = self._live[cid] = next(self._generation)
+        self._send(code, ("add", code, cid, generation, store_condition))
+
+    def _unindex_condition(self, code: str, cid: int) -> bool:
+        if cid in self.graph.get(code, {}):
+            return super()._unindex_condition(code, cid)
+        if cid in self._live:
+            del self._live[cid]
+            self._send(code, ("del", cid))
+            return True
+        return False
+
+    def unsubscribe(self, code: str):
+        super().unsubscribe(code)
+        self._send(code, ("evict", code))
+
+    def _gateway(self):
+        while True:
+            msg = self.outbox.get()
+            if msg is None:
+                break
+            _, cid, generation, leg = msg
+            code = self.cond_codes.get(cid)
+            if code is None:
+                continue
+            with self._code_lock(code):
+                with self._lock:
+                    if self._live.get(cid) != generation:
+                        continue
+                    del self._live[cid]
+                    conds = self.conditions[code][cid]
+                    conds.excuted = True
+                    compiled = conds.predicate
+                    if leg is not None:
+                        compiled.leg = leg
+                    if self.journal is not None:
+                        self.journal.executed(cid)
+                self.place_order(
+                    conds, conds.order_contract, compiled.order, conds.excuted_cb
+                )
+                self._archive(cid)
+                self._release(code)
+
+    def integration_tick(self, exchange: Exchange, tick: TickSTKv1):
+        if tick.simtrade != 1 and tick.code in self.infos.keys():
+            self._send(
+                tick.code,
+                (
+                    "tick",
+                    tick.code,
+                    tick.close,
+                    tick.high,
+                    tick.low,
+                    tick.total_volume,
+                    tick.volume,
+                    tick.tick_type,
+                ),
+            )
+            if tick.code in self.graph.keys():
+                super().integration_tick(exchange, tick)
+
+    def integration_bidask(self, exchange: Exchange, bidask: BidAskSTKv1):
+        if bidask.simtrade != 1 and bidask.code in self.infos.keys():
+            self._send(
+                bidask.code,
+                (
+                    "bidask",
+                    bidask.code,
+                    list(bidask.bid_price),
+                    list(bidask.ask_price),
+                    list(bidask.ask_volume),
+                ),
+            )
+            if bidask.code in self.graph.keys():
+                super().integration_bidask(exchange, bidask)
+
+    def close(self, timeout: typing.Optional[float] = None):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout)
+        self.outbox.put(None)
+        self.gateway.join(timeout)
@@ -0,0 +1,152 @@
+import typing
+from array import array
+from decimal import Decimal
+from pydantic import ConfigDict
+from touchprice.condition import StatusInfo
+from touchprice.rolling import RollingFields
+
+PRICE_COLUMNS = ("close", "buy_price", "sell_price", "high", "low")
+QTY_COLUMNS = ("volume", "total_volume", "ask_volume", "bid_volume")
+FLOAT_COLUMNS = ("change_price", "change_rate", "add_ts")
+COLUMNS = PRICE_COLUMNS + QTY_COLUMNS + FLOAT_COLUMNS
+# price columns hold integer ticks, price * scale of the code
+DEFAULT_SCALE = 100
+
+
+def price_scale(contract: typing.Any) -> int:
+    # enough decimals for the reference and limit prices, at least 0.01
+    decimals = 2
+    for name in ("reference", "limit_up", "limit_down"):
+        price = getattr(contract, name, None)
+        if isinstance(price, (int, float, Decimal)):
+            exponent = Decimal(str(price)).normalize().as_tuple().exponent
+            decimals = max(decimals, -exponent)
+    return 10 ** decimals
+
+
+class QuoteView(StatusInfo):
+    # copy of a row returned by QuoteStore[code], frozen so a write to it
+    # raises instead of silently missing the store; write with store[code]
+    model_config = ConfigDict(frozen=True)
+
+
+def _column(name: str) -> property:
+    def fget(row: "QuoteRow"):
+        return row.store.columns[name][row.slot]
+
+    def fset(row: "QuoteRow", value: typing.Any):
+        row.store.columns[name][row.slot] = value
+
+    return property(fget, fset)
+
+
+class QuoteRow:
+    # attribute view on one slot of a QuoteStore, read by compiled conditions
+    __slots__ = ("store", "slot", "scale")
+
+    def __init__(self, store: "QuoteStore", slot: int, scale: int = DEFAULT_SCALE):
+        self.store = store
+        self.slot = slot
+        self.scale = scale
+
+    def __getattr__(self, name: str):
+        # only reached for rolling window fields like "vwap:60"
+        rolling = self.store.rolling.get(self.slot)
+        if rolling is None:
+            raise AttributeError(name)
+        return rolling.value(name)
+
+
+for _name in COLUMNS:
+    setattr(QuoteRow, _name, _column(_name))
+
+
+class QuoteStore:
+    def __init__(self):
+        self.columns: typing.Dict[str, array] = {
+            name: array("d") if name in FLOAT_COLUMNS else array("q")
+            for name in COLUMNS
+        }
+        self.scales: typing.Dict[str, int] = {}
+        self.slots: typing.Dict[str, int] = {}
+        self.rows: typing.Dict[str, QuoteRow] = {}
+        self.free: typing.List[int] = []
+        self.rolling: typing.Dict[int, RollingFields] = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __contains__(self, code: str):
+        return code in self.slots
+
+    def keys(self):
+        return self.slots.keys()
+
+    def items(self):
+        return ((code, self[code]) for code in self.slots)
+
+    def row(self, code: str) -> QuoteRow:
+        return self.rows[code]
+
+    def scale(self, code: str) -> int:
+        return self.scales.get(code, DEFAULT_SCALE)
+
+    def rolling_fields(
+        self, code: str, base_fields: typing.Tuple[str, ...] = ()
+    ) -> RollingFields:
+        slot = self.slots[code]
+        rolling = self.rolling.get(slot)
+        if rolling is None:
+            rolling = self.rolling[slot] = RollingFields(base_fields)
+        return rolling
+
+    def __getitem__(self, code: str) -> QuoteView:
+        slot = self.slots[code]
+        scale = self.rows[code].scale
+        return QuoteView(
+            **{
+                name: Decimal(column[slot]) / scale
+                if name in PRICE_COLUMNS
+                else column[slot]
+                for name, column in self.columns.items()
+            }
+        )
+
+    def get(self, code: str, default: typing.Any = None):
+        return self[code] if code in self.slots else default
+
+    def __setitem__(self, code: str, info: typing.Any):
+        if not isinstance(info, StatusInfo):
+            info = StatusInfo(**info)
+        slot = self.slots.get(code)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.columns["close"])
+                for column in self.columns.values():
+                    column.append(0)
+            self.slots[code] = slot
+            self.rows[code] = QuoteRow(self, slot)
+        scale = self.rows[code].scale = self.scale(code)
+        for name, column in self.columns.items():
+            value = getattr(info, name)
+            if name in PRICE_COLUMNS:
+                column[slot] = round(value * scale)
+            elif name in QTY_COLUMNS:
+                column[slot] = int(value)
+            else:
+                column[slot] = float(value)
+
+    def pop(self, code: str, default: typing.Any = None):
+        if code not in self.slots:
+            return default
+        info = self[code]
+        self.rows.pop(code)
+        slot = self.slots.pop(code)
+        self.rolling.pop(slot, None)
+        self.free.append(slot)
+        return info
@@ -1,10 +1,32 @@
 import shioaji as sj
 import typing
+import logging
 import datetime
+import itertools
+import time
+import collections
+import threading
+import contextlib
 from shioaji import TickSTKv1, Exchange, BidAskSTKv1
 from pydantic import StrictInt
 from functools import partial
-from touchprice.constant import Trend, PriceType
+from touchprice.constant import Trend, PriceType, Logic, Overflow
+from touchprice.index import ThresholdIndex
+from touchprice.trail import TrailIndex
+from touchprice.dispatch import OrderDispatcher
+from touchprice.store import QuoteStore, price_scale
+from touchprice.replay import replay_columns, first_touch
+from touchprice.metrics import Metrics
+from touchprice.coalesce import Window
+from touchprice.journal import ConditionJournal
+from touchprice.ingest import IngestBuffer, Carry
+from touchprice.predicate import (
+    CompiledCond,
+    CompiledComposite,
+    PRICE_FIELDS,
+    TICK_FIELDS,
+    BIDASK_FIELDS,
+)
 from touchprice.condition import (
     Price,
     TouchOrderCond,
@@ -15,10 +37,22 @@ from touchprice.condition import (
     StatusInfo,
     Qty,
     QtyGap,
+    Trail,
+    Rolling,
     LossProfitCmd,
     StoreLossProfit,
+    BatchReport,
+    TriggerTrace,
+    CompositeCond,
+    SpreadCmd,
+    StoreComposite,
+    exchange_timestamp,
 )
 
+SNAPSHOT_CHUNK = 500
+
+log = logging.getLogger(__name__)
+
 
 def get_contracts(api: sj.Shioaji):
     contracts = {
@@ -29,29 +63,229 @@ def get_contracts(api: sj.Shioaji):
     return contracts
 
 
+class ContractResolver:
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        warmup: typing.Iterable[str] = (),
+        maxsize: typing.Optional[int] = None,
+    ):
+        self.api: sj.Shioaji = api
+        self.maxsize = maxsize
+        self.cache: typing.OrderedDict[
+            str, sj.contracts.Contract
+        ] = collections.OrderedDict()
+        for code in warmup:
+            self[code]
+
+    def lookup(self, code: str) -> sj.contracts.Contract:
+        for name, iter_contract in self.api.Contracts:
+            contract = iter_contract._code2contract.get(code)
+            if contract is not None:
+                return contract
+        raise KeyError(code)
+
+    def __getitem__(self, code: str) -> sj.contracts.Contract:
+        contract = self.cache.get(code)
+        if contract is None:
+            contract = self.lookup(code)
+            self.cache[code] = contract
+            if self.maxsize and len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        elif self.maxsize:
+            self.cache.move_to_end(code)
+        return contract
+
+    def __contains__(self, code: str) -> bool:
+        return self.get(code) is not None
+
+    def get(
+        self, code: str, default: typing.Optional[sj.contracts.Contract] = None
+    ) -> typing.Optional[sj.contracts.Contract]:
+        try:
+            return self[code]
+        except KeyError:
+            return default
+
+
 class TouchOrderExecutor:
-    def __init__(self, api: sj.Shioaji):
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        dispatch_workers: int = 0,
+        contracts_warmup: typing.Iterable[str] = (),
+        contracts_maxsize: typing.Optional[int] = None,
+        metrics: bool = False,
+        trace: bool = False,
+        trace_cb: typing.Optional[typing.Callable[[TriggerTrace], typing.Any]] = None,
+        trace_history: int = 10000,
+        coalesce_window: float = 0,
+        history_size: int = 10000,
+        journal_path: typing.Optional[str] = None,
+        journal_fsync: bool = False,
+        ingest_size: int = 0,
+        ingest_policy: Overflow = Overflow.Block,
+    ):
         self.api: sj.Shioaji = api
+        self.metrics: typing.Optional[Metrics] = Metrics() if metrics else None
+        self.trace: bool = trace or trace_cb is not None
+        self.trace_cb = trace_cb
+        self.traces: typing.Deque[TriggerTrace] = collections.deque(
+            maxlen=trace_history
+        )
+        self.coalesce_window: float = coalesce_window
+        self._windows: typing.Dict[str, Window] = {}
+        self._last_eval: typing.Dict[str, float] = {}
+        self._coalesce_lock = threading.Lock()
+        self.dispatcher: typing.Optional[OrderDispatcher] = (
+            OrderDispatcher(api, workers=dispatch_workers) if dispatch_workers else None
+        )
         self.conditions: typing.Dict[
-            str, typing.List[typing.Union[StoreLossProfit, StoreCond]]
+            str, typing.Dict[int, typing.Union[StoreLossProfit, StoreCond]]
         ] = {}
-        self.infos: typing.Dict[str, StatusInfo] = {}
-        self.contracts: dict = get_contracts(self.api)
-        self.api.quote.set_on_tick_stk_v1_callback(self.integration_tick)
-        self.api.quote.set_on_tick_fop_v1_callback(self.integration_tick)
-        self.api.quote.set_on_bidask_stk_v1_callback(self.integration_bidask)
-        self.api.quote.set_on_bidask_fop_v1_callback(self.integration_bidask)
+        self._infos: QuoteStore = QuoteStore()
+        self.index: typing.Dict[str, ThresholdIndex] = {}
+        self.trails: typing.Dict[str, TrailIndex] = {}
+        # code -> composites reading it, a quote only revisits its own
+        self.graph: typing.Dict[str, typing.Dict[int, CompiledComposite]] = {}
+        self.cond_codes: typing.Dict[int, str] = {}
+        self.history: typing.OrderedDict[
+            int, typing.Tuple[str, StoreCond]
+        ] = collections.OrderedDict()
+        self.history_size: int = history_size
+        self.cond_keys: typing.Dict[int, str] = {}
+        self._signatures: typing.Dict[str, typing.Dict[int, None]] = {}
+        self._cid = itertools.count(1)
+        self.subscribed: typing.Dict[str, sj.contracts.Contract] = {}
+        self.refs: typing.Dict[str, int] = {}
+        self.contracts: ContractResolver = ContractResolver(
+            self.api, warmup=contracts_warmup, maxsize=contracts_maxsize
+        )
+        self.ingest: typing.Optional[IngestBuffer] = None
+        on_tick, on_bidask = self.integration_tick, self.integration_bidask
+        if ingest_size:
+            self.ingest = IngestBuffer(
+                self.integration_tick,
+                self.integration_bidask,
+                size=ingest_size,
+                policy=ingest_policy,
+            )
+            on_tick, on_bidask = self.ingest.put_tick, self.ingest.put_bidask
+        self.api.quote.set_on_tick_stk_v1_callback(on_tick)
+        self.api.quote.set_on_tick_fop_v1_callback(on_tick)
+        self.api.quote.set_on_bidask_stk_v1_callback(on_bidask)
+        self.api.quote.set_on_bidask_fop_v1_callback(on_bidask)
         self.orders: typing.Dict[str, typing.Dict[str, StoreLossProfit]] = {}
+        # a quote callback holds the lock of its code while it updates and
+        # evaluates, so callbacks of different codes run in parallel; _lock
+        # guards what codes share and is always taken after code locks
+        self._lock = threading.RLock()
+        self._code_locks: typing.Dict[str, threading.RLock] = {}
+        self._released: typing.Deque[str] = collections.deque()
+        self.journal: typing.Optional[ConditionJournal] = None
+        if journal_path:
+            self.journal = ConditionJournal(journal_path, fsync=journal_fsync)
+            self.recover()
+
+    @property
+    def infos(self) -> QuoteStore:
+        return self._infos
+
+    @infos.setter
+    def infos(self, infos: typing.Mapping[str, StatusInfo]):
+        self._infos = QuoteStore()
+        for code, info in infos.items():
+            self._infos[code] = info
+
+    def _code_lock(self, code: str) -> threading.RLock:
+        lock = self._code_locks.get(code)
+        if lock is None:
+            lock = self._code_locks.setdefault(code, threading.RLock())
+        return lock
+
+    @contextlib.contextmanager
+    def _locked(self, *codes: str):
+        # several code locks are always taken in sorted order
+        with contextlib.ExitStack() as stack:
+            for code in sorted(set(codes)):
+                stack.enter_context(self._code_lock(code))
+            yield
+
+    def _claim(self, store: typing.Any) -> bool:
+        # the single place a condition turns executed, so it fires once
+        with self._lock:
+            if store.excuted:
+                return False
+            store.excuted = True
+            return True
+
+    def _set_info(self, code: str, snapshot: typing.Any):
+        info = StatusInfo(**snapshot)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        info.add_ts = now.timestamp()
+        with self._code_lock(code), self._lock:
+            self.infos[code] = info
 
     def update_snapshot(self, contract: sj.contracts.Contract):
-        code = contract.target_code if contract.target_code else contract.code
+        code = self.touch_code(contract)
         if code not in self.infos.keys():
             snapshot = self.api.snapshots([contract])[0]
-            self.infos[code] = StatusInfo(**snapshot)
-            now = datetime.datetime.now(datetime.timezone.utc)
-            add_ts = now.timestamp()
-            self.infos[code].add_ts = add_ts
-            volume = self.infos[code].volume
+            self.infos.scales[code] = price_scale(contract)
+            self._set_info(code, snapshot)
+
+    def update_snapshots(self, contracts: typing.Iterable[sj.contracts.Contract]):
+        pending: typing.Dict[str, sj.contracts.Contract] = {}
+        for contract in contracts:
+            code = self.touch_code(contract)
+            if code not in self.infos.keys():
+                pending.setdefault(code, contract)
+        pending_items = list(pending.items())
+        for start in range(0, len(pending_items), SNAPSHOT_CHUNK):
+            chunk = pending_items[start : start + SNAPSHOT_CHUNK]
+            snapshots = self.api.snapshots([contract for _, contract in chunk])
+            for (code, contract), snapshot in zip(chunk, snapshots):
+                self.infos.scales[code] = price_scale(contract)
+                self._set_info(code, snapshot)
+
+    def subscribe(self, contract: sj.contracts.Contract):
+        code = self.touch_code(contract)
+        if code not in self.subscribed.keys():
+            self.api.quote.subscribe(contract, quote_type="tick")
+            self.api.quote.subscribe(contract, quote_type="bidask")
+            self.subscribed[code] = contract
+
+    def unsubscribe(self, code: str):
+        with self._code_lock(code), self._lock:
+            contract = self.subscribed.pop(code, None)
+            if contract is not None:
+                self.api.quote.unsubscribe(contract, quote_type="tick")
+                self.api.quote.unsubscribe(contract, quote_type="bidask")
+            self.infos.pop(code, None)
+            self.index.pop(code, None)
+            self.trails.pop(code, None)
+            self.graph.pop(code, None)
+            self._windows.pop(code, None)
+            self._last_eval.pop(code, None)
+
+    def _release(self, code: str):
+        # callers hold no code lock but the one of code
+        with self._lock:
+            refs = self.refs.get(code, 0) - 1
+            if refs > 0:
+                self.refs[code] = refs
+                return
+            self.refs.pop(code, None)
+        self.unsubscribe(code)
+
+    def _release_deferred(self):
+        # codes of composite legs released while another code lock was held
+        while self._released:
+            try:
+                code = self._released.popleft()
+            except IndexError:
+                break
+            with self._code_lock(code):
+                self._release(code)
 
     @staticmethod
     def set_price(price_info: Price, contract: sj.contracts.Contract):
@@ -69,7 +303,9 @@ class TouchOrderExecutor:
         tconds_dict = condition.touch_cmd.dict(exclude={"code"}, exclude_none=True)
         if tconds_dict:
             for key, value in tconds_dict.items():
-                if key not in ["volume", "total_volume", "ask_volume", "bid_volume"]:
+                if key in ["trail", "vwap", "window_volume", "tick_rate"]:
+                    tconds_dict[key] = getattr(condition.touch_cmd, key)
+                elif key not in ["volume", "total_volume", "ask_volume", "bid_volume"]:
                     tconds_dict[key] = TouchOrderExecutor.set_price(
                         Price(**value), contract
                     )
@@ -77,31 +313,327 @@ class TouchOrderExecutor:
             tconds_dict["order"] = condition.order_cmd.order
             return StoreCond(**tconds_dict)
 
-    def add_condition(self, condition: TouchOrderCond):
-        touch_contract = self.contracts[condition.touch_cmd.code]
-        self.update_snapshot(touch_contract)
-        store_condition = self.adjust_condition(condition, touch_contract)
-        if store_condition:
-            code = (
-                touch_contract.target_code
-                if touch_contract.target_code
-                else touch_contract.code
-            )
+    @staticmethod
+    def signature(condition: TouchOrderCond) -> str:
+        return condition.model_dump_json()
+
+    @staticmethod
+    def touch_code(contract: sj.contracts.Contract) -> str:
+        return contract.target_code if contract.target_code else contract.code
+
+    def _store_condition(
+        self,
+        code: str,
+        store_condition: StoreCond,
+        cid: typing.Optional[int] = None,
+        key: typing.Optional[str] = None,
+    ) -> int:
+        with self._lock:
+            cid = cid if cid else next(self._cid)
             if code in self.conditions.keys():
-                self.conditions[code].append(store_condition)
+                self.conditions[code][cid] = store_condition
             else:
-                self.conditions[code] = [store_condition]
-            self.api.quote.subscribe(touch_contract, quote_type="tick")
-            self.api.quote.subscribe(touch_contract, quote_type="bidask")
-
-    def delete_condition(self, condition: TouchOrderCond):
-        code = condition.touch_cmd.code
-        touch_contract = self.contracts[code]
-        store_condition = self.adjust_condition(condition, touch_contract)
-        if self.conditions.get(code, False) and store_condition:
-            if store_condition in self.conditions[code]:
-                self.conditions[code].remove(store_condition)
-                return self.conditions[code]
+                self.conditions[code] = {cid: store_condition}
+            self._index_condition(code, cid, store_condition)
+            for held in self._held_codes(code, store_condition):
+                self.refs[held] = self.refs.get(held, 0) + 1
+            self.cond_codes[cid] = code
+            if self.journal is not None:
+                self.journal.add(cid, code, key, store_condition)
+            if key is not None:
+                self.cond_keys[cid] = key
+                self._signatures.setdefault(key, {})[cid] = None
+            return cid
+
+    def _forget(self, cid: int) -> typing.Tuple[str, StoreCond]:
+        code = self.cond_codes.pop(cid)
+        key = self.cond_keys.pop(cid, None)
+        if key is not None:
+            cids = self._signatures[key]
+            del cids[cid]
+            if not cids:
+                del self._signatures[key]
+        store_condition = self.conditions[code].pop(cid)
+        if isinstance(store_condition, StoreLossProfit):
+            orders = self.orders.get(code, {})
+            orders.pop(store_condition.trade_id, None)
+            if not orders:
+                self.orders.pop(code, None)
+        return code, store_condition
+
+    def _remove_condition(
+        self, cid: int, release: bool = True
+    ) -> typing.Optional[StoreCond]:
+        with self._lock:
+            if cid not in self.cond_codes.keys():
+                history = self.history.pop(cid, None)
+                return history[1] if history else None
+            code, store_condition = self._forget(cid)
+            if self.journal is not None:
+                self.journal.deleted(cid)
+            unindexed = self._unindex_condition(code, cid)
+        if unindexed and release:
+            for held in self._held_codes(code, store_condition):
+                self._release(held)
+        return store_condition
+
+    @staticmethod
+    def _held_codes(code: str, store_condition: typing.Any) -> typing.Iterable[str]:
+        # a composite keeps every code of its legs subscribed
+        if isinstance(store_condition, StoreComposite):
+            return store_condition.codes
+        return (code,)
+
+    def _archive(self, cid: int):
+        # executed conditions leave the live dicts for the bounded history
+        with self._lock:
+            if cid in self.cond_codes.keys():
+                self.history[cid] = self._forget(cid)
+                if len(self.history) > self.history_size:
+                    self.history.popitem(last=False)
+
+    def _index_condition(self, code: str, cid: int, store_condition: StoreCond):
+        if isinstance(store_condition, StoreComposite):
+            compiled = store_condition.predicate.to_ticks(self.infos.scale)
+            compiled.cid = cid
+            for leg_code, leg in compiled.legs:
+                self._track_rolling(leg_code, leg)
+            for leg_code in store_condition.codes:
+                self.graph.setdefault(leg_code, {})[cid] = compiled
+            return
+        if isinstance(store_condition, StoreCond) and store_condition.trail:
+            # trailing stops are only reached through their running peak
+            row = self.infos.row(code)
+            if code not in self.trails.keys():
+                self.trails[code] = TrailIndex(row.scale)
+            self.trails[code].add(
+                cid, store_condition.predicate.to_ticks(row.scale), row.close
+            )
+            return
+        if code not in self.index.keys():
+            self.index[code] = ThresholdIndex()
+        compiled = store_condition.predicate.to_ticks(self.infos.scale(code))
+        self.index[code].add(cid, compiled)
+        self._track_rolling(code, compiled)
+
+    def _track_rolling(self, code: str, compiled: CompiledCond):
+        for key, _, _ in compiled.fields:
+            if ":" in key:
+                self.infos.rolling_fields(code, TICK_FIELDS).add(key)
+
+    def _unindex_condition(self, code: str, cid: int) -> bool:
+        compiled = self.graph.get(code, {}).get(cid)
+        if compiled is not None:
+            for leg_code in compiled.store.codes:
+                composites = self.graph.get(leg_code, {})
+                composites.pop(cid, None)
+                if not composites:
+                    self.graph.pop(leg_code, None)
+            return True
+        if code in self.index.keys() and self.index[code].remove(cid) is not None:
+            return True
+        return code in self.trails.keys() and self.trails[code].remove(cid) is not None
+
+    def add_condition(self, condition: TouchOrderCond) -> typing.Optional[int]:
+        touch_contract = self.contracts[condition.touch_cmd.code]
+        with self._code_lock(self.touch_code(touch_contract)):
+            self.update_snapshot(touch_contract)
+            store_condition = self.adjust_condition(condition, touch_contract)
+            if store_condition:
+                cid = self._store_condition(
+                    self.touch_code(touch_contract),
+                    store_condition,
+                    key=self.signature(condition),
+                )
+                self.subscribe(touch_contract)
+                return cid
+
+    def add_conditions(self, conditions: typing.List[TouchOrderCond]) -> BatchReport:
+        report = BatchReport(ids=[None] * len(conditions))
+        last = time.perf_counter()
+
+        def lap(phase: str):
+            nonlocal last
+            now = time.perf_counter()
+            report.timings[phase] = now - last
+            last = now
+
+        touch_contracts: typing.Dict[str, sj.contracts.Contract] = {}
+        groups: typing.Dict[str, typing.List[typing.Tuple[int, TouchOrderCond]]] = {}
+        for num, condition in enumerate(conditions):
+            touch_contract = self.contracts[condition.touch_cmd.code]
+            code = self.touch_code(touch_contract)
+            touch_contracts[code] = touch_contract
+            groups.setdefault(code, []).append((num, condition))
+        lap("group")
+        self.update_snapshots(touch_contracts.values())
+        lap("snapshot")
+        stored = set()
+        for code, group in groups.items():
+            touch_contract = touch_contracts[code]
+            with self._code_lock(code):
+                for num, condition in group:
+                    store_condition = self.adjust_condition(condition, touch_contract)
+                    if store_condition:
+                        report.ids[num] = self._store_condition(
+                            code, store_condition, key=self.signature(condition)
+                        )
+                        stored.add(code)
+        lap("store")
+        for code in stored:
+            with self._code_lock(code):
+                self.subscribe(touch_contracts[code])
+        lap("subscribe")
+        report.timings["total"] = sum(report.timings.values())
+        return report
+
+    def add_loss_profit(
+        self,
+        trade: sj.order.Trade,
+        cmd: LossProfitCmd,
+        excuted_cb: typing.Callable[[sj.order.Trade], typing.Any] = print,
+    ) -> typing.Optional[int]:
+        # stop loss and take profit on the close of the traded contract, the
+        # first leg that touches places its order and cancels the other one
+        store_lp = StoreLossProfit(
+            loss_close=cmd.loss_pricegap,
+            profit_close=cmd.profit_pricegap,
+            order_contract=trade.contract,
+            loss_order=cmd.loss_order,
+            profit_order=cmd.profit_order,
+            excuted_cb=excuted_cb,
+            trade_id=trade.order.id,
+        )
+        if store_lp.predicate.fields:
+            code = self.touch_code(trade.contract)
+            with self._code_lock(code):
+                self.update_snapshot(trade.contract)
+                cid = self._store_condition(code, store_lp)
+                with self._lock:
+                    self.orders.setdefault(code, {})[store_lp.trade_id] = store_lp
+                self.subscribe(trade.contract)
+                return cid
+
+    def add_composite(self, condition: CompositeCond) -> typing.Optional[int]:
+        touch_contracts: typing.Dict[str, sj.contracts.Contract] = {}
+
+        def leg_code(code: str) -> str:
+            contract = self.contracts[code]
+            touch_contracts[self.touch_code(contract)] = contract
+            return self.touch_code(contract)
+
+        touch_cmds = []
+        for touch_cmd in condition.touch_cmds:
+            if touch_cmd.trail is not None:
+                # a leg only reads the quote row, it has no running peak
+                raise ValueError("trail is not supported in composite legs")
+            code = leg_code(touch_cmd.code)
+            touch_cmd = touch_cmd.model_copy(update=dict(code=code), deep=True)
+            for key in PRICE_FIELDS:
+                price_info = getattr(touch_cmd, key)
+                if price_info is not None:
+                    self.set_price(price_info, touch_contracts[code])
+            touch_cmds.append(touch_cmd)
+        spreads = [
+            spread.model_copy(
+                update=dict(code=leg_code(spread.code), other=leg_code(spread.other))
+            )
+            for spread in condition.spreads
+        ]
+        if touch_contracts:
+            with self._locked(*touch_contracts):
+                self.update_snapshots(touch_contracts.values())
+                cid = self._store_condition(
+                    next(iter(touch_contracts)),
+                    StoreComposite(
+                        touch_cmds=touch_cmds,
+                        spreads=spreads,
+                        logic=condition.logic,
+                        order_contract=self.contracts[condition.order_cmd.code],
+                        order=condition.order_cmd.order,
+                    ),
+                )
+                for touch_contract in touch_contracts.values():
+                    self.subscribe(touch_contract)
+                return cid
+
+    def recover(self) -> typing.List[int]:
+        # restore journaled conditions under their old ids, fired ones stay gone
+        journal, self.journal = self.journal, None
+        try:
+            records = journal.load()
+            touch_contracts: typing.Dict[str, sj.contracts.Contract] = {}
+            for code, _, store_condition in records.values():
+                for held in self._held_codes(code, store_condition):
+                    if held not in touch_contracts.keys():
+                        touch_contracts[held] = self.contracts[held]
+            self.update_snapshots(touch_contracts.values())
+            for cid, (code, key, store_condition) in records.items():
+                self._store_condition(code, store_condition, cid=cid, key=key)
+                if isinstance(store_condition, StoreLossProfit):
+                    orders = self.orders.setdefault(code, {})
+                    orders[store_condition.trade_id] = store_condition
+            for touch_contract in touch_contracts.values():
+                self.subscribe(touch_contract)
+            self._cid = itertools.count(max(journal.last_cid + 1, next(self._cid)))
+        finally:
+            self.journal = journal
+        return list(records)
+
+    def get_condition(self, cid: int) -> typing.Optional[StoreCond]:
+        code = self.cond_codes.get(cid)
+        if code is not None:
+            return self.conditions[code].get(cid)
+        history = self.history.get(cid)
+        if history is not None:
+            return history[1]
+
+    def find_condition(self, condition: TouchOrderCond) -> typing.Optional[int]:
+        cids = self._signatures.get(self.signature(condition))
+        if cids:
+            return next(iter(cids))
+
+    def delete_condition(
+        self, condition: typing.Union[int, TouchOrderCond]
+    ) -> typing.Optional[StoreCond]:
+        cid = (
+            condition
+            if isinstance(condition, int)
+            else self.find_condition(condition)
+        )
+        if cid is not None:
+            code = self.cond_codes.get(cid)
+            codes = self._held_codes(code, self.get_condition(cid)) if code else ()
+            with self._locked(*codes):
+                return self._remove_condition(cid)
+
+    def modify_condition(
+        self, cid: int, condition: TouchOrderCond
+    ) -> typing.Optional[int]:
+        code = self.cond_codes.get(cid)
+        if code is None:
+            return None
+        touch_contract = self.contracts[condition.touch_cmd.code]
+        with self._locked(code, self.touch_code(touch_contract)):
+            if self.cond_codes.get(cid) != code or not isinstance(
+                self.conditions[code][cid], StoreCond
+            ):
+                return None
+            self.update_snapshot(touch_contract)
+            store_condition = self.adjust_condition(condition, touch_contract)
+            if store_condition:
+                live = not self.conditions[code][cid].excuted
+                self._remove_condition(cid, release=False)
+                self._store_condition(
+                    self.touch_code(touch_contract),
+                    store_condition,
+                    cid=cid,
+                    key=self.signature(condition),
+                )
+                self.subscribe(touch_contract)
+                if live:
+                    self._release(code)
+                return cid
 
     def touch_cond(self, info: typing.Dict, value: typing.Union[StrictInt, float]):
         trend = info.pop("trend")
@@ -117,77 +649,374 @@ class TouchOrderExecutor:
                 if data == value:
                     return True
 
-    def touch(self, code: str):
-        conditions = self.conditions.get(code, False)
-        if conditions:
-            info = self.infos[code].dict()
-            for num, conds in enumerate(conditions):
-                if not conds.excuted:
-                    order_contract = conds.order_contract
-                    if isinstance(conds, StoreCond):
-                        order = conds.order
-                        cond = conds.dict(
-                            exclude={
-                                "order",
-                                "order_contract",
-                                "excuted",
-                                "excuted_cb",
-                            },
-                            exclude_none=True,
-                        )
-                        if all(
-                            self.touch_cond(value, float(info[key]))
-                            for key, value in cond.items()
-                        ):
-                            self.conditions[code][num].excuted = True
-                            self.conditions[code][num].result = self.api.place_order(
-                                order_contract,
-                                order,
-                                cb=self.conditions[code][num].excuted_cb,
-                            )
+    def place_order(
+        self,
+        store: typing.Any,
+        contract: sj.contracts.Contract,
+        order: sj.Order,
+        cb: typing.Callable[[sj.order.Trade], typing.Any],
+    ):
+        if self.dispatcher is None:
+            sent_ts = time.time() if self.trace else 0
+            if self.metrics is not None:
+                start = time.perf_counter_ns()
+                store.result = self.api.place_order(contract, order, cb=cb)
+                self.metrics.observe("place_order", time.perf_counter_ns() - start)
+            else:
+                store.result = self.api.place_order(contract, order, cb=cb)
+            if self.trace:
+                self._order_placed(store, sent_ts, time.time())
+        else:
+            self.dispatcher.submit(
+                store,
+                contract,
+                order,
+                cb,
+                placed_cb=self._order_placed if self.trace else None,
+            )
+
+    def _order_placed(self, store: typing.Any, sent_ts: float, placed_ts: float):
+        trace = store.trace
+        if trace is not None:
+            trace.sent_ts = sent_ts
+            trace.placed_ts = placed_ts
+            self.traces.append(trace)
+            if self.trace_cb is not None:
+                self.trace_cb(trace)
+
+    def drain_traces(self) -> typing.List[TriggerTrace]:
+        traces = []
+        while self.traces:
+            traces.append(self.traces.popleft())
+        return traces
+
+    def touch(
+        self,
+        code: str,
+        exchange_ts: typing.Optional[datetime.datetime] = None,
+        callback_ts: float = 0,
+        window: typing.Optional[Window] = None,
+        fields: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        index = self.index.get(code, False)
+        if index:
+            metrics = self.metrics
+            if metrics is not None:
+                start = time.perf_counter_ns()
+            if window is None:
+                info = self.infos.row(code)
+                crossed = index.crossed(info, fields, pending=True)
+            else:
+                crossed = index.crossed_window(window, window.fields, pending=True)
+            fired = []
+            for compiled in crossed:
+                conds = compiled.store
+                if conds.excuted:
+                    continue
+                if (
+                    compiled(info) if window is None else compiled.touched(window)
+                ) and self._claim(conds):
+                    index.remove(compiled.cid)
+                    fired.append(compiled)
+            if metrics is not None:
+                metrics.observe("evaluate", time.perf_counter_ns() - start)
+                metrics.incr("conditions_evaluated", len(crossed))
+                metrics.incr("triggers", len(fired))
+            if fired:
+                self._fire(code, fired, exchange_ts, callback_ts)
+
+    def touch_trails(
+        self,
+        code: str,
+        exchange_ts: typing.Optional[datetime.datetime] = None,
+        callback_ts: float = 0,
+    ):
+        trails = self.trails.get(code, False)
+        if trails:
+            metrics = self.metrics
+            if metrics is not None:
+                start = time.perf_counter_ns()
+            info = self.infos.row(code)
+            crossed = trails.crossed(info.close)
+            fired = []
+            for compiled in crossed:
+                conds = compiled.store
+                if not conds.excuted and compiled(info) and self._claim(conds):
+                    trails.remove(compiled.cid)
+                    fired.append(compiled)
+            if metrics is not None:
+                metrics.observe("evaluate", time.perf_counter_ns() - start)
+                metrics.incr("conditions_evaluated", len(crossed))
+                metrics.incr("triggers", len(fired))
+            if fired:
+                self._fire(code, fired, exchange_ts, callback_ts)
+
+    def touch_composites(
+        self,
+        code: str,
+        exchange_ts: typing.Optional[datetime.datetime] = None,
+        callback_ts: float = 0,
+    ):
+        composites = self.graph.get(code, False)
+        if composites:
+            metrics = self.metrics
+            if metrics is not None:
+                start = time.perf_counter_ns()
+            infos = self.infos
+            # legs on other codes are read without their locks, a composite
+            # may be evaluated from two callbacks but is claimed once
+            composites = list(composites.values())
+            fired = [
+                compiled
+                for compiled in composites
+                if not compiled.store.excuted
+                and compiled(infos)
+                and self._claim(compiled.store)
+            ]
+            with self._lock:
+                for compiled in fired:
+                    self._unindex_condition(
+                        self.cond_codes[compiled.cid], compiled.cid
+                    )
+            if metrics is not None:
+                metrics.observe("evaluate", time.perf_counter_ns() - start)
+                metrics.incr("conditions_evaluated", len(composites))
+                metrics.incr("triggers", len(fired))
+            if fired:
+                self._fire(code, fired, exchange_ts, callback_ts)
+
+    def _fire(
+        self,
+        code: str,
+        fired: typing.List[CompiledCond],
+        exchange_ts: typing.Optional[datetime.datetime],
+        callback_ts: float,
+    ):
+        if self.trace:
+            evaluated_ts = time.time()
+            for compiled in fired:
+                compiled.store.trace = TriggerTrace(
+                    code=code,
+                    exchange_ts=exchange_ts,
+                    callback_ts=callback_ts or evaluated_ts,
+                    evaluated_ts=evaluated_ts,
+                )
+        for compiled in fired:
+            conds = compiled.store
+            # a claimed condition is archived and released even if its order
+            # fails, so the orders of the others are still sent
+            try:
+                if self.journal is not None:
+                    with self._lock:
+                        self.journal.executed(compiled.cid)
+                self.place_order(
+                    conds, conds.order_contract, compiled.order, conds.excuted_cb
+                )
+            except Exception:
+                log.exception("place_order failed for condition %s", compiled.cid)
+            finally:
+                self._archive(compiled.cid)
+                for held in self._held_codes(code, conds):
+                    if held == code:
+                        self._release(held)
+                    else:
+                        self._released.append(held)
+
+    def _evaluate(
+        self,
+        code: str,
+        fields: typing.Tuple[str, ...],
+        exchange_ts: typing.Optional[datetime.datetime],
+        callback_ts: float,
+    ):
+        if not self.coalesce_window:
+            self.touch(code, exchange_ts, callback_ts, fields=fields)
+            return
+        now = time.monotonic()
+        with self._coalesce_lock:
+            window = self._windows.get(code)
+            if window is not None:
+                window.update(self.infos.row(code), fields)
+                self._hold(code, window)
+                return
+            due = self._last_eval.get(code, 0) + self.coalesce_window
+            if now >= due:
+                self._last_eval[code] = now
+            else:
+                window = self._windows[code] = Window(
+                    self.infos.row(code), fields, exchange_ts, callback_ts
+                )
+                self._hold(code, window)
+                timer = threading.Timer(due - now, self.flush, args=(code,))
+                timer.daemon = True
+                timer.start()
+                return
+        self.touch(code, exchange_ts, callback_ts, fields=fields)
+
+    def _hold(self, code: str, window: Window):
+        index = self.index.get(code)
+        if index is not None and index.multi:
+            window.hold(index.multi.values())
+
+    def flush(self, code: typing.Optional[str] = None):
+        with self._coalesce_lock:
+            codes = [code] if code else list(self._windows)
+            windows = [
+                (code, self._windows.pop(code))
+                for code in codes
+                if code in self._windows.keys()
+            ]
+            now = time.monotonic()
+            for code, _ in windows:
+                self._last_eval[code] = now
+        for code, window in windows:
+            with self._code_lock(code):
+                self.touch(code, window.exchange_ts, window.callback_ts, window)
+        if self._released:
+            self._release_deferred()
 
     def integration_bidask(self, exchange: Exchange, bidask: BidAskSTKv1):
+        metrics = self.metrics
         if bidask.simtrade == 1:
-            pass
+            if metrics is not None:
+                metrics.incr("simtrade_dropped")
         else:
+            if metrics is not None:
+                start = time.perf_counter_ns()
+                metrics.incr("bidasks")
+            callback_ts = time.time() if self.trace else 0
             code = bidask.code
-            if code in self.infos.keys():
-                info = self.infos[code]
-                if 0 not in bidask.ask_volume:
-                    info.buy_price = bidask.bid_price[0]
-                    info.sell_price = bidask.ask_price[0]
-                    self.touch(code)
-
-    def integration_tick(self, exchange: Exchange, tick: TickSTKv1):
+            with self._code_lock(code):
+                row = self.infos.rows.get(code)
+                if row is not None:
+                    slot, scale = row.slot, row.scale
+                    columns = self.infos.columns
+                    if 0 not in bidask.ask_volume:
+                        columns["buy_price"][slot] = round(bidask.bid_price[0] * scale)
+                        columns["sell_price"][slot] = round(bidask.ask_price[0] * scale)
+                        if metrics is not None:
+                            metrics.observe("update", time.perf_counter_ns() - start)
+                        self._evaluate(
+                            code,
+                            BIDASK_FIELDS,
+                            getattr(bidask, "datetime", None),
+                            callback_ts,
+                        )
+                        if code in self.graph.keys():
+                            self.touch_composites(
+                                code, getattr(bidask, "datetime", None), callback_ts
+                            )
+            if self._released:
+                self._release_deferred()
+
+    def integration_tick(
+        self, exchange: Exchange, tick: TickSTKv1, carry: typing.Optional[Carry] = None
+    ):
+        metrics = self.metrics
         if tick.simtrade == 1:
-            pass
+            if metrics is not None:
+                metrics.incr("simtrade_dropped")
         else:
+            if metrics is not None:
+                start = time.perf_counter_ns()
+                metrics.incr("ticks")
+            callback_ts = time.time() if self.trace else 0
             code = tick.code
-            if code in self.infos.keys():
-                info = self.infos[code]
-                info.close = tick.close
-                info.high = tick.high
-                info.low = tick.low
-                info.total_volume = tick.total_volume
-                info.volume = tick.volume
-                if tick.tick_type == 1:
-                    info.ask_volume = (
-                        info.ask_volume + info.volume
-                        if info.ask_volume
-                        else info.volume
-                    )
-                    info.bid_volume = 0
-                elif tick.tick_type == 2:
-                    info.bid_volume = (
-                        info.bid_volume + info.volume
-                        if info.bid_volume
-                        else info.volume
+            with self._code_lock(code):
+                row = self.infos.rows.get(code)
+                if row is not None:
+                    slot, scale = row.slot, row.scale
+                    columns = self.infos.columns
+                    columns["close"][slot] = round(tick.close * scale)
+                    columns["high"][slot] = round(tick.high * scale)
+                    columns["low"][slot] = round(tick.low * scale)
+                    columns["total_volume"][slot] = tick.total_volume
+                    columns["volume"][slot] = volume = tick.volume
+                    if carry is not None:
+                        # ticks conflated into this one by the ingest buffer
+                        ask_volume = columns["ask_volume"]
+                        bid_volume = columns["bid_volume"]
+                        ask_volume[slot] = carry.ask + (
+                            0 if carry.ask_reset else ask_volume[slot]
+                        )
+                        bid_volume[slot] = carry.bid + (
+                            0 if carry.bid_reset else bid_volume[slot]
+                        )
+                    if tick.tick_type == 1:
+                        ask_volume = columns["ask_volume"]
+                        ask_volume[slot] = (
+                            ask_volume[slot] + volume if ask_volume[slot] else volume
+                        )
+                        columns["bid_volume"][slot] = 0
+                    elif tick.tick_type == 2:
+                        bid_volume = columns["bid_volume"]
+                        bid_volume[slot] = (
+                            bid_volume[slot] + volume if bid_volume[slot] else volume
+                        )
+                        columns["ask_volume"][slot] = 0
+                    rolling = self.infos.rolling.get(slot)
+                    if rolling is None:
+                        fields = TICK_FIELDS
+                    else:
+                        exchange_ts = getattr(tick, "datetime", None)
+                        ts = (
+                            exchange_timestamp(exchange_ts)
+                            if exchange_ts
+                            else time.time()
+                        )
+                        if carry is not None:
+                            rolling.merge(ts, carry.volume, carry.amount, carry.ticks)
+                        rolling.update(ts, columns["close"][slot] / scale, volume)
+                        fields = rolling.fields
+                    if metrics is not None:
+                        metrics.observe("update", time.perf_counter_ns() - start)
+                    if code in self.trails.keys():
+                        self.touch_trails(
+                            code, getattr(tick, "datetime", None), callback_ts
+                        )
+                    self._evaluate(
+                        code, fields, getattr(tick, "datetime", None), callback_ts
                     )
-                    info.ask_volume = 0
-                self.touch(code)
+                    if code in self.graph.keys():
+                        self.touch_composites(
+                            code, getattr(tick, "datetime", None), callback_ts
+                        )
+            if self._released:
+                self._release_deferred()
+
+    def replay(
+        self,
+        code: str,
+        close: typing.Sequence[float],
+        high: typing.Sequence[float],
+        low: typing.Sequence[float],
+        volume: typing.Sequence[int],
+        tick_type: typing.Sequence[int],
+        total_volume: typing.Optional[typing.Sequence[int]] = None,
+    ) -> typing.Dict[int, int]:
+        index = self.index.get(code, False)
+        if not index:
+            return {}
+        row = self.infos.row(code)
+        columns = replay_columns(
+            row, close, high, low, volume, tick_type, total_volume, scale=row.scale
+        )
+        return first_touch(index.entries.values(), columns)
 
-    def show_condition(self, code: str = None):
+    def show_condition(self, code: str = None, status: str = "all"):
+        # status: "active", "executed" or "all"
+        conditions: typing.Dict[str, typing.Dict[int, StoreCond]] = {}
+        if status in ("active", "all"):
+            if code:
+                conditions[code] = dict(self.conditions.get(code, {}))
+            else:
+                conditions = {
+                    key: dict(value) for key, value in self.conditions.items()
+                }
+        if status in ("executed", "all"):
+            for cid, (key, store_condition) in self.history.items():
+                if not code or key == code:
+                    conditions.setdefault(key, {})[cid] = store_condition
         if code:
-            return self.conditions[code]
-        else:
-            return self.conditions
+            return conditions.get(code, {})
+        return conditions
@@ -0,0 +1,135 @@
+import typing
+import operator
+from bisect import bisect_left, bisect_right, insort
+from touchprice.constant import Trend
+from touchprice.predicate import CompiledCond, tick_threshold
+
+INF = float("inf")
+
+
+class TrailGroup:
+    # stops sharing one running peak, sorted by offset so a tick only reads
+    # the prefix whose offset it crossed
+    __slots__ = ("peak", "offsets", "percents")
+
+    def __init__(self, peak: float):
+        self.peak = peak
+        self.offsets: typing.List[typing.Tuple[float, int]] = []
+        self.percents: typing.List[typing.Tuple[float, int]] = []
+
+
+class TrailSide:
+    # prices are multiplied by sign, so stops below a running high (sign 1)
+    # and above a running low (sign -1) both track a peak; a new peak moves
+    # the peak of a single group in place, several groups under it are merged
+    # into the largest so a stop only moves while its group is the smaller
+    def __init__(self, sign: int):
+        self.sign = sign
+        self.peaks: typing.List[float] = []
+        self.groups: typing.List[TrailGroup] = []
+
+    def add(self, cid: int, price: float, offset: float, percent: bool):
+        key = self.sign * price
+        self.update(price)
+        num = bisect_left(self.peaks, key)
+        if num == len(self.peaks) or self.peaks[num] != key:
+            self.peaks.insert(num, key)
+            self.groups.insert(num, TrailGroup(key))
+        keys = self.groups[num].percents if percent else self.groups[num].offsets
+        keys.insert(bisect_right(keys, (offset, cid)), (offset, cid))
+
+    def update(self, price: float, entries: typing.Optional[typing.Container] = None):
+        key = self.sign * price
+        peaks = self.peaks
+        if not peaks or peaks[0] >= key:
+            return
+        num = bisect_left(peaks, key)
+        if num < len(peaks) and peaks[num] == key:
+            num += 1
+        if num == 1:
+            self.groups[0].peak = peaks[0] = key
+            return
+        groups = self.groups[:num]
+        group = max(groups, key=lambda group: len(group.offsets) + len(group.percents))
+        group.peak = key
+        for merged in groups:
+            if merged is group:
+                continue
+            for keys, into in [
+                (merged.offsets, group.offsets),
+                (merged.percents, group.percents),
+            ]:
+                for k in keys:
+                    if entries is None or k[1] in entries:
+                        insort(into, k)
+        peaks[:num] = [key]
+        self.groups[:num] = [group]
+
+    def crossed(self, price: float, hits: typing.Set[int]):
+        key = self.sign * price
+        for group in self.groups:
+            gap = group.peak - key
+            if gap <= 0:
+                continue
+            keys = group.offsets
+            if keys:
+                hits.update(cid for _, cid in keys[: bisect_right(keys, (gap, INF))])
+            keys = group.percents
+            if keys:
+                ratio = gap * 100 / abs(group.peak)
+                hits.update(cid for _, cid in keys[: bisect_right(keys, (ratio, INF))])
+
+    def compact(self, entries: typing.Container):
+        peaks, groups = [], []
+        for group in self.groups:
+            group.offsets = [k for k in group.offsets if k[1] in entries]
+            group.percents = [k for k in group.percents if k[1] in entries]
+            if group.offsets or group.percents:
+                peaks.append(group.peak)
+                groups.append(group)
+        self.peaks = peaks
+        self.groups = groups
+
+
+class TrailIndex:
+    COMPACT_MIN = 32
+
+    def __init__(self, scale: typing.Optional[int] = None):
+        # offsets in ticks when prices are ticks of scale
+        self.scale = scale
+        self.down = TrailSide(1)
+        self.up = TrailSide(-1)
+        self.entries: typing.Dict[int, CompiledCond] = {}
+        self.dead: int = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, cid: int, compiled: CompiledCond, price: float):
+        trail = compiled.store.trail
+        compiled.cid = cid
+        self.entries[cid] = compiled
+        side = self.up if trail.trend == Trend.Up else self.down
+        offset = trail.offset
+        if self.scale is not None and not trail.percent:
+            offset = tick_threshold(offset, operator.ge, self.scale)
+        side.add(cid, price, offset, trail.percent)
+
+    def remove(self, cid: int) -> typing.Optional[CompiledCond]:
+        compiled = self.entries.pop(cid, None)
+        if compiled is not None:
+            self.dead += 1
+            if self.dead > max(self.COMPACT_MIN, len(self.entries)):
+                self.down.compact(self.entries)
+                self.up.compact(self.entries)
+                self.dead = 0
+        return compiled
+
+    def crossed(self, price: float) -> typing.List[CompiledCond]:
+        hits = set()
+        for side in (self.down, self.up):
+            if side.groups:
+                side.update(price, self.entries if self.dead else None)
+                side.crossed(price, hits)
+        entries = self.entries
+        return [entries[cid] for cid in sorted(hits) if cid in entries]